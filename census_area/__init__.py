@@ -1,7 +1,11 @@
+import asyncio
 import logging
 import census
 
-from .core import ACS5Client, SF1Client, PLClient
+from .cache import ResponseCache, SQLiteCache
+from .core import ACS5Client, SF1Client, PLClient, RateLimiter, census_session
+from .aio import (AsyncGeoClient, AsyncGeoBlockClient, AsyncACS5Client,
+                  AsyncSF1Client, AsyncPLClient, AiohttpTransport)
 
 
 class Census(census.Census):
@@ -13,9 +17,85 @@ class Census(census.Census):
     * acs5: instance of ACS5Client
     * sf1: instance of SF1Client
     * pl: instance of PLClient
+
+    The clients share response_cache, a ResponseCache for Census API
+    responses, a requests session, created with census_session unless
+    one is passed in, and a rate limiter, so that requests_per_second
+    limits the requests of all the clients together. Other keyword
+    arguments, such as max_workers, are passed to each client.
+
+    Call close(), or use it as a context manager, to stop the clients'
+    threads when done.
     '''
-    def __init__(self, key, year=None, session=None):
+    def __init__(self, key, year=None, session=None, response_cache=None,
+                 requests_per_second=None, rate_limiter=None, **kwargs):
+        self._owns_session = session is None
+        if session is None:
+            session = census_session(kwargs.get('retries', 3), kwargs.get('max_workers'))
         super(Census, self).__init__(key, year, session)
-        self.acs5 = ACS5Client(key, year, session)
-        self.sf1 = SF1Client(key, year, session)
-        self.pl = PLClient(key, year, session)
+        if response_cache is None:
+            response_cache = ResponseCache()
+        if rate_limiter is None and requests_per_second:
+            rate_limiter = RateLimiter(requests_per_second)
+        kwargs['rate_limiter'] = rate_limiter
+        self.acs5 = ACS5Client(key, year, self.session, response_cache=response_cache, **kwargs)
+        self.sf1 = SF1Client(key, year, self.session, response_cache=response_cache, **kwargs)
+        self.pl = PLClient(key, year, self.session, response_cache=response_cache, **kwargs)
+
+    def close(self):
+        for client in (self.acs5, self.sf1, self.pl):
+            client.close()
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncCensus(object):
+    '''
+    Asyncio version of Census
+
+    Attributes:
+
+    * acs5: AsyncGeoClient for an ACS5Client
+    * sf1: AsyncGeoBlockClient for an SF1Client
+    * pl: AsyncGeoBlockClient for a PLClient
+
+    The clients share one transport, and so one connection pool, and a
+    limit of max_concurrency requests in flight at once. The transport
+    defaults to an AiohttpTransport; pass any other with the same request
+    method, for instance to use a local stand-in server. Other keyword
+    arguments are passed to Census.
+
+    Await close(), or use it as an asynchronous context manager, to close
+    the transport when done.
+    '''
+    def __init__(self, key, year=None, transport=None, max_concurrency=8, **kwargs):
+        self.census = Census(key, year, **kwargs)
+
+        self._owns_transport = transport is None
+        if transport is None:
+            transport = AiohttpTransport(limit=max_concurrency)
+        self.transport = transport
+
+        shared = {'transport': transport,
+                  'max_concurrency': max_concurrency,
+                  'semaphore': asyncio.Semaphore(max_concurrency)}
+        self.acs5 = AsyncGeoClient(self.census.acs5, **shared)
+        self.sf1 = AsyncGeoBlockClient(self.census.sf1, **shared)
+        self.pl = AsyncGeoBlockClient(self.census.pl, **shared)
+
+    async def close(self):
+        if self._owns_transport:
+            await self.transport.close()
+        self.census.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
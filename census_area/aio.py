@@ -0,0 +1,765 @@
+import asyncio
+import collections
+import functools
+import itertools
+import json
+import threading
+import time
+
+import census.core
+from census.core import supported_years
+import esridump
+
+from . import core
+from .core import ACS5Client, SF1Client, PLClient
+from .crosswalk import Crosswalk
+from .variables import GEO_URLS
+
+# Most items a worker thread produces ahead of the event loop consuming them
+BUFFER_SIZE = 100
+
+
+class Response(collections.namedtuple('Response', ['url', 'status', 'content'])):
+    '''
+    Response to a request made through a transport, which can be read as
+    a requests response, so that both clients parse responses alike
+    '''
+    __slots__ = ()
+
+    @property
+    def status_code(self):
+        return self.status
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    @property
+    def request(self):
+        # esridump reports errors with the URL of a response's request
+        return self
+
+
+class AiohttpTransport(object):
+    '''
+    HTTP transport of the asyncio clients, an aiohttp session whose pool of
+    up to limit connections is shared by the clients using the transport.
+    Requires aiohttp (pip install census_area[async]).
+
+    With base_urls set to a dictionary of URL prefixes and their
+    replacements, such as {'https://api.census.gov': 'http://localhost:8080'},
+    requests are sent to a local stand-in server instead.
+
+    Any object with an awaitable request(method, url, params=None,
+    data=None) method returning a Response can be used as a transport
+    instead.
+    '''
+    def __init__(self, limit=100, timeout=30, base_urls=None):
+        self.limit = limit
+        self.timeout = timeout
+        self.base_urls = base_urls or {}
+        self._session = None
+
+    async def request(self, method, url, params=None, data=None):
+        if self._session is None:
+            try:
+                import aiohttp
+            except ImportError:
+                raise ImportError('AiohttpTransport requires aiohttp, which can be installed '
+                                  'with pip install census_area[async]')
+
+            # The session is created in the event loop that uses it
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.limit),
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        for prefix, replacement in self.base_urls.items():
+            if url.startswith(prefix):
+                url = replacement + url[len(prefix):]
+                break
+
+        async with self._session.request(method, url, params=params, data=data) as response:
+            content = await response.read()
+            return Response(str(response.url), response.status, content)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncGeoClient(object):
+    '''
+    Asyncio interface to a GeoClient, for use from an event loop.
+
+    Census API and tigerweb requests are sent with transport (default: an
+    AiohttpTransport), at most max_concurrency at a time. Clients created
+    by the same AsyncCensus share their transport, and so its connection
+    pool, and their concurrency limit.
+
+    Areas are fetched and overlaid in worker threads, as the GeoClient
+    does, so the event loop is not blocked; their tigerweb requests are
+    sent through the transport on the event loop. The variable values of
+    up to twice max_concurrency parent geographies are requested at once.
+
+    The GeoClient supplies the client's API key, default year, response
+    cache, retries and rate limit, and plans and aggregates the requests.
+    All the AreaFilter options of the GeoClient are available, but not
+    checkpoint.
+    '''
+    def __init__(self, client, transport=None, max_concurrency=8, semaphore=None):
+        self.client = client
+
+        self._owns_transport = transport is None
+        if transport is None:
+            transport = AiohttpTransport(limit=max_concurrency)
+        self.transport = transport
+
+        self.max_concurrency = max_concurrency
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max_concurrency)
+        self.semaphore = semaphore
+
+    @property
+    def default_year(self):
+        return self.client.default_year
+
+    async def close(self):
+        '''
+        Close the client's transport, if it created it
+        '''
+        if self._owns_transport:
+            await self.transport.close()
+        self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def _request(self, method, url, stats=None, params=None, data=None):
+        async with self.semaphore:
+            response = await self.transport.request(method, url, params=params, data=data)
+
+        if stats is not None:
+            stats.add_request(response.url, len(response.content))
+
+        return response
+
+    async def get(self, fields, geo, year=None, **kwargs):
+        '''
+        Awaitable version of GeoClient.get
+        '''
+        if year is None:
+            year = self.default_year
+
+        fields = census.core.list_or_str(fields)
+        stats = kwargs.get('stats')
+
+        results = self.client.response_cache.get(self.client.dataset, year, fields, geo)
+        if stats is not None:
+            stats.add_cache(results is not None)
+
+        if results is None:
+            start = time.monotonic()
+            try:
+                chunks, sort_by_geoid = core._field_chunks(fields, year)
+                results = core._merged(await asyncio.gather(*(self._query(chunk, geo, year, sort_by_geoid, stats)
+                                                              for chunk in chunks)))
+            finally:
+                if stats is not None:
+                    stats.add_time('census', time.monotonic() - start)
+            self.client.response_cache.set(self.client.dataset, year, fields, geo, results)
+
+        return results
+
+    async def _query(self, fields, geo, year, sort_by_geoid, stats):
+        '''
+        Awaitable version of GeoClient.query
+        '''
+        url, params = self.client._census_query(fields, geo, year, sort_by_geoid)
+        headers, data = core._census_data(await self._census_request(url, params, stats))
+        types = [core.PREDICATE_TYPES.get(predicate_type, str)
+                 for predicate_type in await asyncio.gather(*(self._predicate_type(header, year, stats)
+                                                              for header in headers))]
+
+        return core._census_rows(headers, data, types, sort_by_geoid)
+
+    async def _census_request(self, url, params, stats):
+        '''
+        Send a Census API request, limited to the client's rate, retrying
+        it with exponential backoff if it fails with a 429 or 5xx status
+        '''
+        rate_limiter = self.client.rate_limiter
+        for attempt in itertools.count():
+            if rate_limiter is not None:
+                delay = rate_limiter.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            response = await self._request('GET', url, stats, params=params)
+
+            delay = core._retry_delay(response.status, attempt, self.client.retries)
+            if delay is None:
+                return response
+            await asyncio.sleep(delay)
+
+    async def _predicate_type(self, field, year, stats=None):
+        key = (field, year)
+        if key not in self.client._predicate_types:
+            url, params = self.client._definition_query(field, year)
+            response = await self._census_request(url, params, stats)
+            self.client._predicate_types[key] = core._predicate_type(response)
+
+        return self.client._predicate_types[key]
+
+    async def _check_aggregatable(self, fields, year, kwargs):
+        fields = self.client._aggregated_fields(fields, kwargs)
+        core._check_predicate_types(fields, await asyncio.gather(*(self._predicate_type(field, year)
+                                                                   for field in fields)))
+
+    def _dumper(self):
+        '''
+        Return a function creating EsriDumpers that send their requests
+        through the transport on the running event loop, for the GeoClient's
+        AreaFilters to use from worker threads
+        '''
+        return functools.partial(_TransportDumper, self, asyncio.get_running_loop())
+
+    def _area_filter(self, geojson_geometry, layer, year, kwargs, **defaults):
+        return self.client._area_filter(geojson_geometry, layer, year, kwargs,
+                                        dumper=self._dumper(), **defaults)
+
+    def _feature_areas(self, geometries, layer, year, kwargs, **defaults):
+        return self.client._feature_areas(geometries, layer, year, kwargs,
+                                          dumper=self._dumper(), **defaults)
+
+    async def _map_ahead(self, func, items):
+        '''
+        Yield each item of an asynchronous iterator with await func(item),
+        keeping up to twice max_concurrency calls in flight, in the order of
+        the items
+        '''
+        pending = collections.deque()
+        try:
+            async for item in items:
+                pending.append((item, asyncio.ensure_future(func(item))))
+                if len(pending) >= 2 * self.max_concurrency:
+                    item, task = pending.popleft()
+                    yield item, await task
+
+            while pending:
+                item, task = pending.popleft()
+                yield item, await task
+        finally:
+            # Stop the calls in flight if the consumer stops early
+            for _, task in pending:
+                task.cancel()
+
+    async def _join_units(self, fields, areas, geography, parent_within, year, **kwargs):
+        '''
+        Yield each area of an iterable of areas and proportions with its
+        variable values and proportion, requesting the values for the
+        areas that share a parent geography at once
+        '''
+        async def fetch(parent):
+            within, parent_areas = parent
+            return await self._unit_index(fields, geography, core._unit_ids(geography, parent_areas),
+                                          within, year, **kwargs)
+
+        parents = _threaded(core._parent_groups(areas, parent_within))
+        async for (_, parent_areas), units in self._map_ahead(fetch, parents):
+            for unit in core._joined(parent_areas, units):
+                yield unit
+
+    async def _unit_index(self, fields, geography, unit_ids, within, year, **kwargs):
+        return core._indexed(await self.get(fields, core._unit_geo(geography, unit_ids, within),
+                                            year, **kwargs))
+
+    async def _unit_values(self, fields, geography, geoids, year, **kwargs):
+        async def fetch(parent):
+            within, unit_ids = parent
+            return await self._unit_index(fields, geography, unit_ids, within, year, **kwargs)
+
+        units = {}
+        async for _, parent_units in self._map_ahead(fetch, _threaded(core._geoid_parents(geography, geoids))):
+            units.update(parent_units)
+
+        return [units.get(geoid, {}) for geoid in geoids]
+
+    async def _geo_units(self, fields, geojson_geometry, resolution, year, kwargs):
+        if 'checkpoint' in kwargs:
+            raise ValueError('checkpoint is not available with asyncio clients')
+
+        layer, geography, parent_within = core._resolution(resolution)
+        areas = self._area_filter(geojson_geometry, layer, year, kwargs)
+
+        async for unit in self._join_units(fields, areas, geography, parent_within, year, **kwargs):
+            yield unit
+
+    @supported_years(*core.RESOLUTION_YEARS['tract'])
+    def geo_tract(self, fields, geojson_geometry, year=None, **kwargs):
+        '''
+        Asynchronous iterator over the three-tuples of GeoClient.geo_tract
+        '''
+        if year is None:
+            year = self.default_year
+
+        return self._geo_units(fields, geojson_geometry, 'tract', year, kwargs)
+
+    @supported_years(*core.RESOLUTION_YEARS['blockgroup'])
+    def geo_blockgroup(self, fields, geojson_geometry, year=None, **kwargs):
+        '''
+        Asynchronous iterator over the three-tuples of
+        GeoClient.geo_blockgroup
+        '''
+        if year is None:
+            year = self.default_year
+
+        return self._geo_units(fields, geojson_geometry, 'blockgroup', year, kwargs)
+
+    async def geo(self, fields, geojson_geometry, year=None, resolution='tract', ignore_missing=False,
+                  crosswalk=None, weights=None, covering=False, years=None, **kwargs):
+        '''
+        Awaitable version of GeoClient.geo
+        '''
+        if years is not None:
+            return await self._geo_years(fields, geojson_geometry, years, resolution, ignore_missing,
+                                         crosswalk, weights, covering, kwargs)
+
+        if year is None:
+            year = self.default_year
+
+        fields = census.core.list_or_str(fields)
+        core._aggregate_resolution(resolution, year)
+        await self._check_aggregatable(fields, year, kwargs)
+
+        if crosswalk is not None:
+            core._check_crosswalk(crosswalk)
+            aggregate, = await self._aggregate_crosswalk(fields, crosswalk, year, ignore_missing,
+                                                         weights, kwargs)
+            return aggregate
+
+        if covering:
+            core._check_covering(resolution)
+            features = self._covering(fields, geojson_geometry, year, **kwargs)
+        else:
+            geo_units = getattr(self, 'geo_' + resolution)
+            features = geo_units(fields, geojson_geometry, year=year, **kwargs)
+
+        features = [feature async for feature in features]
+        if kwargs.get('approximate') or kwargs.get('tolerance'):
+            features = core._log_proportion_error(features)
+
+        return core._aggregate_units(fields, features, ignore_missing, weights)
+
+    async def _geo_years(self, fields, geojson_geometry, years, resolution, ignore_missing,
+                         crosswalk, weights, covering, kwargs):
+        years, layer = core._years_layer(resolution, years, covering)
+        options = core._area_filter_options(kwargs)
+
+        # Years with the same boundaries share a crosswalk
+        crosswalks = {}
+        if crosswalk is not None:
+            crosswalks[crosswalk.url] = crosswalk
+
+        aggregates = {}
+        for year in years:
+            url = core._vintage(layer, year)
+            if url not in crosswalks:
+                crosswalks[url] = await self.crosswalk(geojson_geometry, year, resolution, **options)
+
+            aggregates[year] = await self.geo(fields, geojson_geometry, year, resolution, ignore_missing,
+                                              crosswalk=crosswalks[url], weights=weights, **kwargs)
+
+        return aggregates
+
+    async def _covering(self, fields, geojson_geometry, year, **kwargs):
+        core._check_two_phase(kwargs, 'covering')
+
+        options = core._area_filter_options(kwargs)
+
+        tracts = self._area_filter(geojson_geometry, 'tracts', year, dict(options))
+        covered = await _in_thread(list, tracts.contained())
+
+        async for unit in self._join_units(fields, covered, 'tract', core._county_within, year, **kwargs):
+            yield unit
+
+        # Block groups outside the covered tracts overlap with the rest of
+        # the geometry as much as with the whole of it
+        remainder = core._remainder(tracts.geo, covered)
+        if remainder is None:
+            return
+
+        block_groups = self._area_filter(remainder, 'block groups', year, dict(options))
+
+        async for unit in self._join_units(fields, block_groups, 'block group', core._tract_within,
+                                           year, **kwargs):
+            yield unit
+
+    async def geo_many(self, fields, feature_collection, year=None, resolution='tract', ignore_missing=False,
+                       crosswalk=None, weights=None, **kwargs):
+        '''
+        Asynchronous iterator over the two-tuples of GeoClient.geo_many
+        '''
+        if year is None:
+            year = self.default_year
+
+        fields = census.core.list_or_str(fields)
+        layer, geography, parent_within = core._aggregate_resolution(resolution, year)
+        await self._check_aggregatable(fields, year, kwargs)
+
+        features = feature_collection['features']
+
+        if crosswalk is not None:
+            core._check_crosswalk(crosswalk, features)
+            aggregates = await self._aggregate_crosswalk(fields, crosswalk, year, ignore_missing,
+                                                         weights, kwargs)
+        else:
+            _, joined = self._feature_areas(feature_collection, layer, year, kwargs)
+            units = [unit async for unit in self._join_units(fields, joined, geography,
+                                                             parent_within, year, **kwargs)]
+            aggregates = core._joined_aggregates(fields, resolution, geography, len(features), units,
+                                                 ignore_missing, weights)
+
+        for feature, aggregate in zip(features, aggregates):
+            yield feature, aggregate
+
+    async def crosswalk(self, geometries, year=None, resolution='tract', **kwargs):
+        '''
+        Awaitable version of GeoClient.crosswalk
+        '''
+        if year is None:
+            year = self.default_year
+
+        layer, _, _ = core._aggregate_resolution(resolution, year)
+        feature_geos, joined = self._feature_areas(geometries, layer, year, kwargs)
+
+        return await _in_thread(Crosswalk.from_joined, resolution, GEO_URLS[layer][year],
+                                len(feature_geos), joined)
+
+    async def _aggregate_crosswalk(self, fields, crosswalk, year, ignore_missing, weights, kwargs):
+        geography = core._crosswalk_geography(crosswalk, year)
+        core._area_filter_options(kwargs)
+        rows = await self._unit_values(fields, geography, crosswalk.geoids, year, **kwargs)
+
+        return core._aggregate_rows(fields, crosswalk, rows, ignore_missing, weights)
+
+    def state_place_tract(self, *args, **kwargs):
+        '''
+        Awaitable result of GeoClient.state_place_tract, or, with stream
+        set, an asynchronous iterator over its results
+        '''
+        return self._state_place_area('tract', *args, **kwargs)
+
+    def state_place_blockgroup(self, *args, **kwargs):
+        '''
+        Awaitable result of GeoClient.state_place_blockgroup, or, with
+        stream set, an asynchronous iterator over its results
+        '''
+        return self._state_place_area('blockgroup', *args, **kwargs)
+
+    async def state_places_tract(self, *args, **kwargs):
+        '''
+        Awaitable version of GeoClient.state_places_tract
+        '''
+        return await self._state_places_area('tract', *args, **kwargs)
+
+    async def state_places_blockgroup(self, *args, **kwargs):
+        '''
+        Awaitable version of GeoClient.state_places_blockgroup
+        '''
+        return await self._state_places_area('blockgroup', *args, **kwargs)
+
+    def _state_place_area(self, resolution, fields, state, place, year=None, return_geometry=False,
+                          years=None, stream=False, **kwargs):
+        if year is None:
+            year = self.default_year
+
+        if return_geometry:
+            core._check_two_phase(kwargs, 'return_geometry')
+
+        if years is not None:
+            if stream:
+                raise ValueError('stream cannot be used with years in asyncio clients')
+            return self._state_place_years(resolution, fields, state, place, years,
+                                           return_geometry, kwargs)
+
+        features = _features(self._state_place_units(resolution, fields, state, place, year, kwargs),
+                             return_geometry)
+        if stream:
+            return features
+
+        return _collect(features, return_geometry)
+
+    async def _state_place_units(self, resolution, fields, state, place, year, kwargs):
+        place_geojson = await self._place_geometry(state, place, year, kwargs)
+
+        geo_units = getattr(self, 'geo_' + resolution)
+        async for unit in geo_units(fields, place_geojson, year=year, **kwargs):
+            yield unit
+
+    async def _state_place_years(self, resolution, fields, state, place, years, return_geometry, kwargs):
+        layer, geography, parent_within = core._resolution(resolution)
+        years = core._check_years(resolution, years, self.client.place_years)
+        options = core._area_filter_options(kwargs)
+
+        vintages = {}
+        results = {}
+        for year in years:
+            vintage = core._place_vintage(layer, year)
+            if vintage not in vintages:
+                place_geojson = await self._place_geometry(state, place, year, options)
+                areas = self._area_filter(place_geojson, layer, year, dict(options))
+                vintages[vintage] = await _in_thread(core._vintage_records, areas, geography, return_geometry)
+
+            units = self._join_units(fields, core._record_areas(vintages[vintage]), geography,
+                                     parent_within, year, **kwargs)
+            results[year] = await _collect(_features(units, return_geometry), return_geometry)
+
+        return results
+
+    async def _place_geometry(self, state, place, year, kwargs):
+        return await _in_thread(self.client._place_geometry, state, place, year, kwargs, self._dumper())
+
+    async def _state_places_area(self, resolution, fields, state, year=None, return_geometry=False, **kwargs):
+        if year is None:
+            year = self.default_year
+
+        if return_geometry:
+            core._check_two_phase(kwargs, 'return_geometry')
+
+        layer, geography, parent_within = core._resolution(resolution)
+
+        places = await _in_thread(self.client._state_places, state, year, kwargs, self._dumper())
+        _, joined = self._feature_areas({'type': 'FeatureCollection', 'features': places},
+                                        layer, year, kwargs)
+        units = [unit async for unit in self._join_units(fields, joined, geography,
+                                                         parent_within, year, **kwargs)]
+
+        return core._place_results(fields, geography, places, units, return_geometry)
+
+
+class AsyncGeoBlockClient(AsyncGeoClient):
+
+    @supported_years(*core.RESOLUTION_YEARS['block'])
+    def geo_block(self, fields, geojson_geometry, year=None, **kwargs):
+        '''
+        Asynchronous iterator over the three-tuples of
+        GeoBlockClient.geo_block
+        '''
+        if year is None:
+            year = self.default_year
+        return self._geo_units(fields, geojson_geometry, 'block', year, kwargs)
+
+    def state_place_block(self, *args, **kwargs):
+        '''
+        Awaitable result of GeoBlockClient.state_place_block, or, with
+        stream set, an asynchronous iterator over its results
+        '''
+        return self._state_place_area('block', *args, **kwargs)
+
+    async def state_places_block(self, *args, **kwargs):
+        '''
+        Awaitable version of GeoBlockClient.state_places_block
+        '''
+        return await self._state_places_area('block', *args, **kwargs)
+
+
+class AsyncACS5Client(AsyncGeoClient):
+    '''
+    Asyncio interface to ACS5Client
+    '''
+    def __init__(self, key, year=None, transport=None, max_concurrency=8, semaphore=None, **kwargs):
+        super().__init__(ACS5Client(key, year, **kwargs),
+                         transport, max_concurrency, semaphore)
+
+    @supported_years(*ACS5Client.place_years)
+    def state_place_tract(self, *args, **kwargs):
+        return super().state_place_tract(*args, **kwargs)
+
+    @supported_years(*ACS5Client.place_years)
+    def state_place_blockgroup(self, *args, **kwargs):
+        return super().state_place_blockgroup(*args, **kwargs)
+
+    @supported_years(*ACS5Client.place_years)
+    def state_places_tract(self, *args, **kwargs):
+        return super().state_places_tract(*args, **kwargs)
+
+    @supported_years(*ACS5Client.place_years)
+    def state_places_blockgroup(self, *args, **kwargs):
+        return super().state_places_blockgroup(*args, **kwargs)
+
+
+class AsyncSF1Client(AsyncGeoBlockClient):
+    '''
+    Asyncio interface to SF1Client
+    '''
+    def __init__(self, key, year=None, transport=None, max_concurrency=8, semaphore=None, **kwargs):
+        super().__init__(SF1Client(key, year, **kwargs),
+                         transport, max_concurrency, semaphore)
+
+    @supported_years(*SF1Client.place_years)
+    def state_place_tract(self, *args, **kwargs):
+        return super().state_place_tract(*args, **kwargs)
+
+    @supported_years(*SF1Client.place_years)
+    def state_place_blockgroup(self, *args, **kwargs):
+        return super().state_place_blockgroup(*args, **kwargs)
+
+    @supported_years(*SF1Client.place_years)
+    def state_place_block(self, *args, **kwargs):
+        return super().state_place_block(*args, **kwargs)
+
+    @supported_years(*SF1Client.place_years)
+    def state_places_tract(self, *args, **kwargs):
+        return super().state_places_tract(*args, **kwargs)
+
+    @supported_years(*SF1Client.place_years)
+    def state_places_blockgroup(self, *args, **kwargs):
+        return super().state_places_blockgroup(*args, **kwargs)
+
+    @supported_years(*SF1Client.place_years)
+    def state_places_block(self, *args, **kwargs):
+        return super().state_places_block(*args, **kwargs)
+
+
+class AsyncPLClient(AsyncGeoBlockClient):
+    '''
+    Asyncio interface to PLClient
+    '''
+    def __init__(self, key, year=None, transport=None, max_concurrency=8, semaphore=None, **kwargs):
+        super().__init__(PLClient(key, year, **kwargs),
+                         transport, max_concurrency, semaphore)
+
+    @supported_years(*PLClient.place_years)
+    def state_place_tract(self, *args, **kwargs):
+        return super().state_place_tract(*args, **kwargs)
+
+    @supported_years(*PLClient.place_years)
+    def state_place_blockgroup(self, *args, **kwargs):
+        return super().state_place_blockgroup(*args, **kwargs)
+
+    @supported_years(*PLClient.place_years)
+    def state_place_block(self, *args, **kwargs):
+        return super().state_place_block(*args, **kwargs)
+
+    @supported_years(*PLClient.place_years)
+    def state_places_tract(self, *args, **kwargs):
+        return super().state_places_tract(*args, **kwargs)
+
+    @supported_years(*PLClient.place_years)
+    def state_places_blockgroup(self, *args, **kwargs):
+        return super().state_places_blockgroup(*args, **kwargs)
+
+    @supported_years(*PLClient.place_years)
+    def state_places_block(self, *args, **kwargs):
+        return super().state_places_block(*args, **kwargs)
+
+
+class _TransportDumper(esridump.EsriDumper):
+    '''
+    EsriDumper that sends its requests through an AsyncGeoClient's
+    transport, on an event loop running in another thread
+    '''
+    def __init__(self, client, loop, url, stats, **kwargs):
+        super().__init__(url, **kwargs)
+        self.client = client
+        self.loop = loop
+        self.stats = stats
+
+    def _request(self, method, url, **kwargs):
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self.loop:
+            raise RuntimeError('tigerweb requests of asyncio clients are made from worker threads, '
+                               'not from the event loop')
+
+        request = self.client._request(method, url, self.stats,
+                                       params=_strings(kwargs.get('params')),
+                                       data=_strings(kwargs.get('data')))
+        return asyncio.run_coroutine_threadsafe(request, self.loop).result()
+
+
+def _strings(args):
+    # As requests would encode them
+    if args is None:
+        return None
+    return {key: str(value) for key, value in args.items()}
+
+
+async def _in_thread(func, *args):
+    '''
+    Call func(*args) in a worker thread, such as to iterate over an
+    AreaFilter, and return its result
+    '''
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def _threaded(iterable, size=BUFFER_SIZE):
+    '''
+    Asynchronously iterate over an iterable in a worker thread, which runs
+    up to size items ahead of the consumer, so that fetching and overlaying
+    areas does not block the event loop. Errors in the worker thread are
+    raised to the consumer.
+    '''
+    loop = asyncio.get_running_loop()
+    buffer = asyncio.Queue()
+    slots = threading.Semaphore(size)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            if slots.acquire(timeout=0.1):
+                loop.call_soon_threadsafe(buffer.put_nowait, item)
+                return True
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+        else:
+            put((done, None))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = await buffer.get()
+            slots.release()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Let the worker thread stop if the consumer stops early
+        stopped.set()
+
+
+async def _features(units, return_geometry):
+    async for feature, result, _ in units:
+        if return_geometry:
+            feature['properties'].update(result)
+            yield feature
+        else:
+            yield result
+
+
+async def _collect(features, return_geometry):
+    features = [feature async for feature in features]
+    if return_geometry:
+        return {'type': "FeatureCollection", 'features': features}
+    else:
+        return features
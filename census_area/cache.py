@@ -0,0 +1,253 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class SQLiteCache(object):
+    '''
+    Persistent cache of JSON serializable values in a SQLite database, which
+    can be shared by several threads and processes.
+
+    Entries older than ttl seconds are treated as missing. When the stored
+    values grow past max_size bytes, the least recently used entries are
+    evicted. Set either to None for no limit.
+    '''
+    def __init__(self, path, ttl=30 * 24 * 60 * 60, max_size=2 ** 30):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS entries
+                                  (key TEXT PRIMARY KEY,
+                                   value BLOB,
+                                   size INTEGER,
+                                   created REAL,
+                                   accessed REAL)''')
+            connection.execute('''CREATE INDEX IF NOT EXISTS entries_accessed
+                                  ON entries (accessed)''')
+
+    def _connection(self):
+        # SQLite connections cannot be shared across threads, or survive a
+        # fork, so each thread of each process opens its own
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def get(self, key):
+        '''
+        Return the value stored for key, or None if there is none or it has
+        expired
+        '''
+        now = time.time()
+        with self._connection() as connection:
+            row = connection.execute('SELECT value, created FROM entries WHERE key = ?',
+                                     (key,)).fetchone()
+            if row is None:
+                return None
+
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                return None
+
+            connection.execute('UPDATE entries SET accessed = ? WHERE key = ?',
+                               (now, key))
+
+        return json.loads(zlib.decompress(value))
+
+    def set(self, key, value):
+        self.set_serialized(key, json.dumps(value, separators=(',', ':')))
+
+    def set_serialized(self, key, serialized):
+        '''
+        Store a value that has already been serialized as JSON
+        '''
+        value = zlib.compress(serialized.encode('utf-8'))
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                               (key, value, len(value), now, now))
+            if self.max_size is not None:
+                self._evict(connection)
+
+    def keys(self, prefix=''):
+        '''
+        Return the keys of the stored entries that start with prefix
+        '''
+        # A range of keys, unlike LIKE, is looked up in the primary key's
+        # index
+        successor = _successor(prefix)
+        with self._connection() as connection:
+            if successor is None:
+                rows = connection.execute('SELECT key FROM entries WHERE key >= ?',
+                                          (prefix,)).fetchall()
+            else:
+                rows = connection.execute('SELECT key FROM entries WHERE key >= ? AND key < ?',
+                                          (prefix, successor)).fetchall()
+        return [key for key, in rows]
+
+    def __getstate__(self):
+        # Connections are opened again in the process the cache is sent to
+        state = dict(self.__dict__)
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _evict(self, connection):
+        total, = connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()
+        if total <= self.max_size:
+            return
+
+        rows = connection.execute('SELECT key, size FROM entries ORDER BY accessed').fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_size:
+                break
+            evicted.append((key,))
+            total -= size
+
+        connection.executemany('DELETE FROM entries WHERE key = ?', evicted)
+
+
+class ResponseCache(object):
+    '''
+    Cache of Census API responses, keyed by dataset, year, fields and
+    geography clause.
+
+    Up to memory_size responses are kept in memory, evicting the least
+    recently used. With disk set to a SQLiteCache, responses are also
+    stored there, so they survive restarts and are shared by every process
+    using the same file.
+
+    A request is also answered from a cached response for more fields, or,
+    when it lists units of a geography, from a cached response for all the
+    units in the same parent geography.
+    '''
+    def __init__(self, memory_size=1024, disk=None):
+        self.memory_size = memory_size
+        self.disk = disk
+
+        self._memory = collections.OrderedDict()
+        self._field_sets = collections.defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, dataset, year, fields, geo):
+        '''
+        Return the cached rows for a request, or None if it cannot be
+        answered from the cache
+        '''
+        fields = frozenset(fields)
+
+        for geo_key, units in self._geo_keys(dataset, year, geo):
+            cached_fields, rows = self._lookup(geo_key, fields)
+            if rows is not None:
+                return [_project(row, fields, cached_fields) for row in rows
+                        if units is None or _unit(row, geo) in units]
+
+        return None
+
+    def set(self, dataset, year, fields, geo, rows):
+        geo_key, _ = self._geo_keys(dataset, year, geo)[0]
+        fields = frozenset(fields)
+
+        # Keep copies, so callers updating the rows they get back do not
+        # change the cache
+        self._remember(geo_key, fields, [dict(row) for row in rows])
+        if self.disk is not None:
+            self.disk.set(_disk_key(geo_key, fields), rows)
+
+    def _geo_keys(self, dataset, year, geo):
+        '''
+        Return the keys of the responses that can answer a request, each
+        with the units to keep from that response, or None to keep all rows
+        '''
+        geography, _, units = geo['for'].rpartition(':')
+        within = geo.get('in', '')
+
+        geo_keys = [('{}/{}?for={}&in={}'.format(dataset, year, geo['for'], within), None)]
+        if units != '*':
+            geo_keys.append(('{}/{}?for={}:*&in={}'.format(dataset, year, geography, within),
+                             set(units.split(','))))
+
+        return geo_keys
+
+    def _lookup(self, geo_key, fields):
+        with self._lock:
+            for cached_fields in self._field_sets.get(geo_key, ()):
+                if fields <= cached_fields:
+                    key = (geo_key, cached_fields)
+                    self._memory.move_to_end(key)
+                    return cached_fields, self._memory[key]
+
+        if self.disk is None:
+            return None, None
+
+        for disk_key in self.disk.keys(geo_key + '|'):
+            cached_fields = frozenset(disk_key[len(geo_key) + 1:].split(','))
+            if fields <= cached_fields:
+                rows = self.disk.get(disk_key)
+                if rows is not None:
+                    self._remember(geo_key, cached_fields, rows)
+                    return cached_fields, rows
+
+        return None, None
+
+    def _remember(self, geo_key, fields, rows):
+        with self._lock:
+            self._memory[(geo_key, fields)] = rows
+            self._memory.move_to_end((geo_key, fields))
+            self._field_sets[geo_key].add(fields)
+
+            while len(self._memory) > self.memory_size:
+                (evicted_geo_key, evicted_fields), _ = self._memory.popitem(last=False)
+                self._field_sets[evicted_geo_key].discard(evicted_fields)
+                if not self._field_sets[evicted_geo_key]:
+                    del self._field_sets[evicted_geo_key]
+
+    def __getstate__(self):
+        # Only the disk tier is shared with other processes
+        return {'memory_size': self.memory_size, 'disk': self.disk}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+def _successor(prefix):
+    '''
+    Return the first string after every string that starts with prefix,
+    or None if there is none
+    '''
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _disk_key(geo_key, fields):
+    return '{}|{}'.format(geo_key, ','.join(sorted(fields)))
+
+
+def _project(row, fields, cached_fields):
+    '''
+    Keep the requested fields of a cached row, and its geography columns
+    '''
+    return {key: value for key, value in row.items()
+            if key in fields or key not in cached_fields}
+
+
+def _unit(row, geo):
+    geography, _, _ = geo['for'].rpartition(':')
+    return row.get(geography)
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+
+
+class Checkpoint(object):
+    '''
+    Local store of the progress of long running geo_* queries, so that a
+    query that fails partway through can be resumed.
+
+    Pass the checkpoint to a geo_* or state_place_* method as checkpoint.
+    Units are stored, with their variable values, each time all the units
+    of a parent geography (a county for tracts, a tract for block groups
+    and blocks) have been joined. When the same query is run again, the
+    stored units are yielded first, and only the units after the last
+    completed parent are downloaded and overlaid.
+
+    Queries are told apart by their arguments, so a checkpoint can be
+    shared by several queries.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS batches
+                                  (job TEXT,
+                                   seq INTEGER,
+                                   parent TEXT,
+                                   units BLOB,
+                                   PRIMARY KEY (job, seq))''')
+            connection.execute('''CREATE TABLE IF NOT EXISTS finished
+                                  (job TEXT PRIMARY KEY)''')
+
+    def _connection(self):
+        # As in SQLiteCache, each thread of each process opens its own
+        # connection
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def batches(self, job):
+        '''
+        Yield the parent key and the units of each batch stored for a job,
+        in the order they were stored
+        '''
+        rows = self._connection().execute('SELECT parent, units FROM batches '
+                                          'WHERE job = ? ORDER BY seq',
+                                          (job,))
+        for parent, units in rows:
+            yield tuple(json.loads(parent)), json.loads(zlib.decompress(units))
+
+    def last(self, job):
+        '''
+        Return the parent key of the last batch stored for a job, or None
+        '''
+        row = self._connection().execute('SELECT parent FROM batches WHERE job = ? '
+                                         'ORDER BY seq DESC LIMIT 1',
+                                         (job,)).fetchone()
+        if row is None:
+            return None
+        return tuple(json.loads(row[0]))
+
+    def add(self, job, parent, units):
+        '''
+        Store the units of a completed parent geography, as a list of
+        three-tuples of area, variable values and proportion
+        '''
+        serialized = json.dumps(units, separators=(',', ':')).encode('utf-8')
+        with self._connection() as connection:
+            connection.execute('INSERT INTO batches '
+                               'SELECT ?, COALESCE(MAX(seq), -1) + 1, ?, ? '
+                               'FROM batches WHERE job = ?',
+                               (job, json.dumps(parent), zlib.compress(serialized), job))
+
+    def finish(self, job):
+        with self._connection() as connection:
+            connection.execute('INSERT OR IGNORE INTO finished VALUES (?)', (job,))
+
+    def is_finished(self, job):
+        row = self._connection().execute('SELECT 1 FROM finished WHERE job = ?',
+                                         (job,)).fetchone()
+        return row is not None
+
+    def clear(self, job=None):
+        '''
+        Forget the progress of a job, or of every job
+        '''
+        with self._connection() as connection:
+            if job is None:
+                connection.execute('DELETE FROM batches')
+                connection.execute('DELETE FROM finished')
+            else:
+                connection.execute('DELETE FROM batches WHERE job = ?', (job,))
+                connection.execute('DELETE FROM finished WHERE job = ?', (job,))
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+
+def job_key(*args):
+    '''
+    Identify a job by its JSON serializable arguments
+    '''
+    serialized = json.dumps(args, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
@@ -1,58 +1,1662 @@
 import collections
-from functools import lru_cache
+import concurrent.futures
+import heapq
+import itertools
+import json
 import logging
+import math
 from logging import NullHandler
+import queue
+import threading
+import time
 
 import census
 from census.core import supported_years
 
+import numpy
+import requests.adapters
+import shapely
+import shapely.errors
 import shapely.geometry
-import shapely.geos
 import esridump
+import urllib3.util
 
+from .cache import ResponseCache
+from .checkpoint import job_key
+from .crosswalk import Crosswalk
+from .records import RecordList
 from .variables import GEO_URLS
 
 
 logging.getLogger(__name__).addHandler(NullHandler())
 
+# Above this many units, ask the Census API for every unit in the parent
+# geography instead of listing them, to keep request URLs short
+MAX_LISTED_UNITS = 50
+
+# Keyword arguments of the geo_* methods that configure the AreaFilter
+# rather than the Census API request
+AREA_FILTER_OPTIONS = ('batch_size', 'workers', 'max_tiles',
+                       'spatial_filter', 'max_query_size', 'two_phase',
+                       'approximate', 'tolerance', 'store', 'cache', 'prefetch')
+
+# Generalization, in degrees, of the areas tigerweb returns when an
+# approximate AreaFilter is asked for without a tolerance
+APPROXIMATE_TOLERANCE = 0.0001
+
+# Decimal places of the coordinates of the areas tigerweb returns
+MAX_GEOMETRY_PRECISION = 9
+
+# Census API responses to retry, with backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Seconds to wait before the first retry of a Census API request, doubled
+# for each further retry
+RETRY_BACKOFF = 1
+
+# Types of the values of Census API variables, by predicate type, as in
+# census.core.Client
+PREDICATE_TYPES = {'fips-for': str,
+                   'fips-in': str,
+                   'int': census.core.float_or_str,
+                   'long': census.core.float_or_str,
+                   'float': float,
+                   'string': str}
+
+# Census API predicate types of the variables that can be aggregated
+AGGREGATABLE_TYPES = ('int', 'long')
+
+# tigerweb fields holding the id of each unit of a Census API geography
+UNIT_FIELDS = {'tract': 'TRACT',
+               'block group': 'BLKGRP',
+               'block': 'BLOCK'}
+
+# Length of the prefix of a unit's GEOID that is the GEOID of its parent
+# geography
+PARENT_GEOID_LENGTHS = {'tract': 5,
+                        'block group': 11,
+                        'block': 11}
+
+# Order in which tigerweb is asked to return areas
+ORDER_FIELDS = ('STATE', 'COUNTY', 'TRACT', 'OID')
+
+# Fields of ORDER_FIELDS that identify the parent geography of each Census
+# API geography, by which checkpointed queries record their progress
+PARENT_FIELDS = {'tract': ORDER_FIELDS[:2],
+                 'block group': ORDER_FIELDS[:3],
+                 'block': ORDER_FIELDS[:3]}
+
+# AreaFilter options that change the areas or proportions a query yields,
+# and so tell checkpointed queries apart
+RESULT_OPTIONS = ('two_phase', 'approximate', 'tolerance')
+
+# Number of areas downloaded ahead of the overlay by a pipelined GeoClient
+PIPELINE_SIZE = 2000
+
+# Number of areas overlaid at a time when batching is asked for without a
+# size, as when the overlay is spread over worker processes
+BATCH_SIZE = 1000
+
 
 class AreaFilter(object):
-    def __init__(self, geojson_geometry, sub_geography_url):
+    '''
+    Iterate over the areas of a tigerweb layer that overlap with a geometry,
+    yielding each area with the proportion of it that overlaps.
+
+    With batch_size set, the overlay is computed for that many areas at a
+    time with vectorized shapely operations instead of one area at a time.
+    With workers set, batches are sent as WKB to a pool of that many
+    processes, and the areas are still yielded in the order tigerweb
+    returns them.
+
+    Rather than querying the bounding box of the whole geometry, tigerweb
+    is queried with the envelopes of up to max_tiles tiles that cover the
+    geometry more tightly, and areas returned by several tiles are kept
+    once.
+
+    With spatial_filter set to 'polygon', each tile sends tigerweb a
+    simplified polygon covering its part of the geometry, instead of its
+    envelope, so only areas near the geometry are returned. The polygon is
+    simplified until its Esri JSON is at most max_query_size characters.
+
+    With two_phase set, each tile first asks tigerweb, without geometry, for
+    the areas within a polygon just inside the geometry, which overlap it
+    entirely. Geometry is then only fetched for the areas that intersect a
+    band around the geometry's boundary. Areas found by the first query are
+    yielded with a geometry of None and a proportion of 1.
+
+    With approximate or tolerance set, tigerweb generalizes the areas it
+    returns so that no vertex moves more than tolerance degrees (default:
+    APPROXIMATE_TOLERANCE). Each area's properties then get a
+    PROPORTION_ERROR, a bound on the error of its proportion.
+
+    With store set to a BoundaryStore holding the layer, areas are read
+    from the store instead of tigerweb, and the tigerweb query options are
+    ignored.
+
+    With cache set to a SQLiteCache, the areas returned by each tigerweb
+    query are stored in the cache and reused by later identical queries.
+
+    With prefetch set, areas are downloaded in a background thread, up to
+    that many ahead of the overlay, so that downloading the next page
+    overlaps with overlaying the current one.
+
+    With after set to values of the leading fields of ORDER_FIELDS, only
+    areas that come after those values in that order are returned, as when
+    resuming an interrupted query.
+
+    With stats set to a Stats, the filter records its tigerweb requests,
+    the areas it downloads, overlays and keeps, and the time spent
+    downloading and overlaying them.
+
+    With dumper set, tigerweb queries are made with dumper(url, stats,
+    **kwargs) instead of an EsriDumper taking the same arguments, for
+    instance to send the requests through another HTTP client.
+    '''
+    def __init__(self, geojson_geometry, sub_geography_url, batch_size=None,
+                 workers=None, max_tiles=16, spatial_filter='envelope',
+                 max_query_size=4000, two_phase=False, approximate=False,
+                 tolerance=None, store=None, cache=None, prefetch=None, after=None,
+                 stats=None, dumper=None):
         self.geo = shapely.geometry.shape(geojson_geometry)
+        if not self.geo.is_valid:
+            self.geo = self.geo.buffer(0)
+
+        # Preparing the query geometry once makes the many intersects and
+        # contains tests against candidate areas cheap
+        shapely.prepare(self.geo)
+
+        self.batch_size = batch_size
+        self.workers = workers
+        self.prefetch = prefetch
+        self.after = tuple(after) if after else None
+        self.stats = stats
+        self._waiting = 0.0
+
+        if approximate and tolerance is None:
+            tolerance = APPROXIMATE_TOLERANCE
+        self.tolerance = tolerance
+
+        if spatial_filter not in ('envelope', 'polygon'):
+            raise ValueError("spatial_filter must be 'envelope' or 'polygon'")
+
+        if store is not None:
+            self.queries = None
+            self.area_dumpers = [store.areas(sub_geography_url, self.geo)]
+            return
+
+        self.sub_geography_url = sub_geography_url
+        self.cache = cache
+        self.dumper = dumper or _esri_dumper
+
+        # The tigerweb queries of the filter, each with whether it asks
+        # for geometry
+        self.queries = []
+        for tile in _tiles(self.geo, max_tiles):
+            query_geometry = {'geometry': ','.join(str(x) for x in tile.bounds),
+                              'geometryType': 'esriGeometryEnvelope',
+                              'spatialRel': 'esriSpatialRelEnvelopeIntersects'}
+
+            if two_phase:
+                interior = _esri_polygon(tile, max_query_size, inside=True)
+                if interior:
+                    esri_polygon, interior_polygon, interior_tolerance = interior
+                    interior_geometry = {'geometry': esri_polygon,
+                                         'geometryType': 'esriGeometryPolygon',
+                                         'spatialRel': 'esriSpatialRelContains'}
+                    self.queries.append((self._query_args(interior_geometry), False))
+
+                    # An area of the tile that is not within the interior
+                    # polygon, including one that crosses into another
+                    # tile, intersects the rest of the tile. The band is
+                    # widened to allow for the rounding of the polygon's
+                    # coordinates.
+                    tile = tile.difference(interior_polygon).buffer(interior_tolerance / 2)
+
+            if spatial_filter == 'polygon' or two_phase:
+                cover = _esri_polygon(tile, max_query_size)
+                if cover:
+                    esri_polygon, _, _ = cover
+                    query_geometry = {'geometry': esri_polygon,
+                                      'geometryType': 'esriGeometryPolygon',
+                                      'spatialRel': 'esriSpatialRelIntersects'}
+
+            self.queries.append((self._query_args(query_geometry), True))
+
+        self.area_dumpers = [self._dumper(query_args, request_geometry)
+                             for query_args, request_geometry in self.queries]
+
+    def _dumper(self, query_args, request_geometry=True):
+        dumper = self.dumper(self.sub_geography_url,
+                             self.stats,
+                             extra_query_args=query_args,
+                             request_geometry=request_geometry)
+        if self.cache is None:
+            return dumper
+
+        return _cached(self.cache,
+                       dumper,
+                       _cache_key(self.sub_geography_url, query_args, request_geometry))
+
+    def _query_args(self, query_geometry):
+        query_args = {'inSR': '4326',
+                      'geometryPrecision': MAX_GEOMETRY_PRECISION,
+                      'orderByFields': ','.join(ORDER_FIELDS)}
+
+        if self.tolerance:
+            query_args.update({'maxAllowableOffset': self.tolerance,
+                               'geometryPrecision': _geometry_precision(self.tolerance)})
+
+        if self.after:
+            query_args['where'] = _after_clause(ORDER_FIELDS[:len(self.after)], self.after)
+
+        query_args.update(query_geometry)
+        return query_args
+
+    def __iter__(self):
+        if self.workers and self.workers > 1:
+            areas = self._overlay_parallel()
+        elif self.batch_size:
+            areas = self._overlay_batches()
+        else:
+            areas = self._overlay()
+
+        if self.stats is not None:
+            areas = _timed(areas, self._overlaid)
+
+        for area, intersection_proportion in areas:
+            if intersection_proportion > 0.01:
+                if self.stats is not None:
+                    self.stats.add_areas('kept')
+                yield area, intersection_proportion
+            elif intersection_proportion > 0 and self.stats is not None:
+                self.stats.add_areas('below_cutoff')
+
+    def contained(self):
+        '''
+        Iterate over the areas within the geometry, each with a proportion
+        of 1, testing whether each area is contained instead of overlaying
+        it
+        '''
+        for batch in _chunks(self._areas(), self.batch_size or BATCH_SIZE):
+            area_geos = _geometries(batch)
+            if self.tolerance:
+                _set_errors(batch, proportion_errors(area_geos, self.tolerance))
+
+            for area, inside in zip(batch, shapely.contains(self.geo, area_geos)):
+                if inside:
+                    if self.stats is not None:
+                        self.stats.add_areas('kept')
+                    yield area, 1.0
+
+    def candidates(self):
+        '''
+        Iterate over the areas tigerweb returns for the geometry, without
+        overlaying them with it, for callers that overlay them with other
+        geometries
+        '''
+        return self._areas()
+
+    def _overlaid(self, seconds):
+        # Time the overlay spent waiting for areas is counted as download
+        # time instead
+        self.stats.add_time('overlay', max(seconds - self._waiting, 0.0))
+        self._waiting = 0.0
+
+    def _waited(self, seconds):
+        self._waiting += seconds
+
+    def _downloaded(self, seconds):
+        self.stats.add_time('tigerweb', seconds)
+
+    def _areas(self):
+        areas = self._merged_areas()
+        if self.after:
+            # Also skip the areas a store returns
+            areas = (area for area in areas
+                     if _order_key(area)[:len(self.after)] > self.after)
+
+        if self.prefetch:
+            areas = _background(areas, self.prefetch)
+
+        if self.stats is not None:
+            areas = _counted(_timed(areas, self._waited), self.stats, 'overlaid')
+
+        return areas
+
+    def _merged_areas(self):
+        '''
+        Merge the areas returned for each tile, which are each in
+        ORDER_FIELDS order, and drop areas already returned by another tile
+        '''
+        area_dumpers = self.area_dumpers
+        if self.stats is not None:
+            area_dumpers = [_counted(_timed(dumper, self._downloaded), self.stats, 'downloaded')
+                            for dumper in area_dumpers]
+
+        if len(area_dumpers) == 1:
+            yield from area_dumpers[0]
+            return
+
+        previous_key = None
+        for area in heapq.merge(*area_dumpers, key=_order_key):
+            key = _order_key(area)
+            if key != previous_key:
+                yield area
+            previous_key = key
+
+    def _overlay(self):
+        for area in self._areas():
+            if area['geometry'] is None:
+                if self.tolerance:
+                    area['properties']['PROPORTION_ERROR'] = 0.0
+                yield area, 1.0
+                continue
+
+            area_geo = shapely.geometry.shape(area['geometry'])
+            if not self.geo.intersects(area_geo):
+                continue
+
+            if self.tolerance:
+                error, = proportion_errors(numpy.array([area_geo]), self.tolerance)
+                area['properties']['PROPORTION_ERROR'] = error
+
+            if self.geo.contains(area_geo):
+                yield area, 1.0
+                continue
+
+            try:
+                intersection = self.geo.intersection(area_geo)
+            except (shapely.errors.TopologicalError, shapely.errors.GEOSException):
+                intersection = self.geo.intersection(area_geo.buffer(0))
+            yield area, intersection.area / area_geo.area
+
+    def _overlay_batches(self):
+        for batch in _chunks(self._areas(), self.batch_size):
+            area_geos = _geometries(batch)
+            proportions = overlay_proportions(self.geo, area_geos)
+            if self.tolerance:
+                _set_errors(batch, proportion_errors(area_geos, self.tolerance))
+            yield from zip(batch, _interior(batch, proportions))
+
+    def _overlay_parallel(self):
+        batches = _chunks(self._areas(), self.batch_size or BATCH_SIZE)
+        with concurrent.futures.ProcessPoolExecutor(self.workers,
+                                                    initializer=_init_overlay_worker,
+                                                    initargs=(self.geo.wkb, self.tolerance)) as executor:
+            overlaid = _map_ahead(executor,
+                                  _overlay_wkb,
+                                  batches,
+                                  lambda batch: (_to_wkb(batch),),
+                                  ahead=2 * self.workers)
+            for batch, (proportions, errors) in overlaid:
+                if self.tolerance:
+                    _set_errors(batch, errors)
+                yield from zip(batch, _interior(batch, proportions))
+
+
+def overlay_proportions(geo, area_geos):
+    '''
+    Compute the proportion of each geometry in the array area_geos that
+    overlaps with geo, which should be prepared.
+    '''
+    proportions = numpy.zeros(len(area_geos))
+
+    intersects = shapely.intersects(geo, area_geos)
+    contained = intersects & shapely.contains(geo, area_geos)
+    proportions[contained] = 1.0
+
+    boundary = intersects & ~contained
+    if boundary.any():
+        boundary_geos = area_geos[boundary]
+        try:
+            intersections = shapely.intersection(geo, boundary_geos)
+        except (shapely.errors.TopologicalError, shapely.errors.GEOSException):
+            intersections = shapely.intersection(geo, shapely.buffer(boundary_geos, 0))
+        proportions[boundary] = shapely.area(intersections) / shapely.area(boundary_geos)
+
+    return proportions
+
+
+def _cache_key(url, query_args, request_geometry=True):
+    '''
+    Return the key under which the features returned by a tigerweb query
+    are stored in a SQLiteCache
+    '''
+    return url + '?' + json.dumps(dict(query_args, returnGeometry=request_geometry),
+                                  sort_keys=True)
+
+
+def _cached(cache, dumper, key):
+    '''
+    Yield the features of an EsriDumper from the cache if they were
+    stored under key, and otherwise fetch them and store them once they
+    have all been fetched
+    '''
+    features = cache.get(key)
+    if features is not None:
+        yield from features
+        return
+
+    serialized = []
+    for feature in dumper:
+        # Serialize before yielding, as callers may update features
+        serialized.append(json.dumps(feature, separators=(',', ':')))
+        yield feature
+
+    cache.set_serialized(key, '[' + ','.join(serialized) + ']')
+
+
+def _tiles(geo, max_tiles):
+    '''
+    Split a geometry into at most max_tiles pieces whose bounding boxes
+    cover it more tightly than its own, by repeatedly splitting the piece
+    whose box covers the most area outside of the geometry into quarters
+    '''
+    def waste(piece):
+        min_x, min_y, max_x, max_y = piece.bounds
+        return (max_x - min_x) * (max_y - min_y) - piece.area
+
+    pieces = [geo]
+    while len(pieces) + 3 <= max_tiles:
+        # Stop once the boxes cover no more than twice the geometry's area
+        if sum(waste(piece) for piece in pieces) <= geo.area:
+            break
+
+        worst = max(pieces, key=waste)
+        min_x, min_y, max_x, max_y = worst.bounds
+        mid_x, mid_y = (min_x + max_x) / 2, (min_y + max_y) / 2
+        quarters = [shapely.clip_by_rect(worst, *box)
+                    for box in ((min_x, min_y, mid_x, mid_y),
+                                (mid_x, min_y, max_x, mid_y),
+                                (min_x, mid_y, mid_x, max_y),
+                                (mid_x, mid_y, max_x, max_y))]
+
+        pieces.remove(worst)
+        pieces.extend(quarter for quarter in quarters if quarter.area > 0)
+
+    return pieces
+
+
+def _esri_polygon(geo, max_size, inside=False):
+    '''
+    Serialize as Esri JSON a simplified polygon that covers geo, or that is
+    inside of geo, growing the simplification tolerance until the JSON is
+    at most max_size characters.
+
+    Returns the JSON, the simplified polygon and the tolerance used, or
+    None if no such polygon is smaller than the geometry's envelope.
+    '''
+    min_x, min_y, max_x, max_y = geo.bounds
+    extent = max(max_x - min_x, max_y - min_y)
+
+    tolerance = max(extent / 10000, 1e-6)
+    while tolerance < extent:
+        # Buffering by the simplification tolerance, outwards or inwards,
+        # keeps the simplified polygon a superset or a subset of the geometry
+        if inside:
+            polygon = geo.buffer(-tolerance).simplify(tolerance / 2)
+        else:
+            polygon = geo.buffer(tolerance).simplify(tolerance / 2)
+
+        if polygon.is_empty:
+            return None
+
+        rings = []
+        for part in getattr(polygon, 'geoms', [polygon]):
+            # Esri expects clockwise outer rings and counterclockwise holes
+            part = shapely.geometry.polygon.orient(part, sign=-1.0)
+            for ring in [part.exterior, *part.interiors]:
+                rings.append([[round(x, 7), round(y, 7)] for x, y in ring.coords])
+
+        esri_json = json.dumps({'rings': rings,
+                                'spatialReference': {'wkid': 4326}},
+                               separators=(',', ':'))
+        if len(esri_json) <= max_size:
+            return esri_json, polygon, tolerance
+
+        tolerance *= 2
+
+    return None
+
+
+def _geometry_precision(tolerance):
+    '''
+    Return the number of decimal places of coordinates for areas
+    generalized by tolerance, so that rounding them moves vertices by at
+    most a hundredth of the tolerance
+    '''
+    return min(max(math.ceil(-math.log10(tolerance)) + 2, 0), MAX_GEOMETRY_PRECISION)
+
+
+def _order_key(area):
+    return tuple(area['properties'][field] for field in ORDER_FIELDS)
+
+
+def _after_clause(fields, values):
+    '''
+    Build a tigerweb where clause for the areas that come after values of
+    fields, in the order of the fields
+    '''
+    clauses = []
+    for i, (field, value) in enumerate(zip(fields, values)):
+        conditions = ["{}='{}'".format(equal_field, equal_value)
+                      for equal_field, equal_value in zip(fields[:i], values[:i])]
+        conditions.append("{}>'{}'".format(field, value))
+        clauses.append('({})'.format(' AND '.join(conditions)))
+
+    return ' OR '.join(clauses)
+
+
+def proportion_errors(area_geos, tolerance):
+    '''
+    Bound the error in the overlap proportions of the geometries in the
+    array area_geos, if their boundaries were generalized by up to
+    tolerance.
+
+    Moving a boundary by up to tolerance changes an area, and the area of
+    its overlap, by at most its perimeter times tolerance, so the
+    proportion changes by at most twice that over the area.
+    '''
+    errors = numpy.zeros(len(area_geos))
+
+    present = ~shapely.is_missing(area_geos)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        bounds = 2 * tolerance * shapely.length(area_geos[present]) / shapely.area(area_geos[present])
+    errors[present] = numpy.fmin(numpy.nan_to_num(bounds, nan=1.0), 1.0)
+
+    return errors
+
+
+def _set_errors(areas, errors):
+    for area, error in zip(areas, errors):
+        area['properties']['PROPORTION_ERROR'] = error
+
+
+_worker_geo = None
+_worker_tolerance = None
+
+
+def _init_overlay_worker(geo_wkb, tolerance):
+    global _worker_geo, _worker_tolerance
+    _worker_geo = shapely.from_wkb(geo_wkb)
+    shapely.prepare(_worker_geo)
+    _worker_tolerance = tolerance
+
+
+def _overlay_wkb(area_wkbs):
+    area_geos = shapely.from_wkb(area_wkbs)
+    proportions = overlay_proportions(_worker_geo, area_geos)
+    if _worker_tolerance:
+        errors = proportion_errors(area_geos, _worker_tolerance)
+    else:
+        errors = None
+    return proportions, errors
+
+
+def _geometries(areas):
+    return numpy.array([shapely.geometry.shape(area['geometry'])
+                        if area['geometry'] is not None else None
+                        for area in areas])
+
+
+def _to_wkb(areas):
+    return shapely.to_wkb(_geometries(areas))
+
+
+def _interior(areas, proportions):
+    '''
+    Set the proportion of areas that came back from tigerweb without
+    geometry, because they are within the query geometry, to 1
+    '''
+    proportions[[area['geometry'] is None for area in areas]] = 1.0
+    return proportions
+
+
+def _map_ahead(executor, func, items, args, ahead):
+    '''
+    Submit func(*args(item)) to the executor for each item, keeping at most
+    `ahead` calls in flight, and yield each item with its result in the
+    order of the items
+    '''
+    pending = collections.deque()
+    for item in items:
+        pending.append((item, executor.submit(func, *args(item))))
+        if len(pending) >= ahead:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+def _background(iterable, size):
+    '''
+    Iterate over iterable in a background thread, which runs up to size
+    items ahead of the consumer. Errors in the background thread are raised
+    to the consumer.
+    '''
+    buffer = queue.Queue(size)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((done, e))
+        else:
+            put((done, None))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Let the background thread stop if the consumer stops early
+        stopped.set()
+
+
+def _timed(iterable, record):
+    '''
+    Yield the items of iterable, calling record with the seconds taken to
+    produce each
+    '''
+    iterator = iter(iterable)
+    while True:
+        start = time.monotonic()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record(time.monotonic() - start)
+            return
+        record(time.monotonic() - start)
+        yield item
+
+
+def _counted(iterable, stats, kind):
+    for item in iterable:
+        stats.add_areas(kind)
+        yield item
+
+
+class _MeasuredDumper(esridump.EsriDumper):
+    '''
+    EsriDumper that records its requests in a Stats
+    '''
+    def __init__(self, url, stats, **kwargs):
+        super().__init__(url, **kwargs)
+        self.stats = stats
+
+    def _request(self, method, url, **kwargs):
+        response = super()._request(method, url, **kwargs)
+        self.stats.add_request(url, len(response.content))
+        return response
+
+
+def _esri_dumper(url, stats, **kwargs):
+    if stats is None:
+        return esridump.EsriDumper(url, **kwargs)
+    return _MeasuredDumper(url, stats, **kwargs)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _area_filter_options(kwargs):
+    '''
+    Remove the AreaFilter options from the keyword arguments of a geo_*
+    method, and return them
+    '''
+    if 'checkpoint' in kwargs:
+        raise ValueError('checkpoint can only be used with the geo_* and state_place_* '
+                         'methods, for a single year')
+
+    options = {option: kwargs.pop(option)
+               for option in AREA_FILTER_OPTIONS
+               if option in kwargs}
+
+    # Census API requests are measured as well, so stats stays in kwargs
+    if 'stats' in kwargs:
+        options['stats'] = kwargs['stats']
+
+    return options
+
+
+def _check_two_phase(kwargs, what):
+    '''
+    Raise a ValueError if two_phase is asked for in kwargs along with what,
+    which needs the geometry of every area
+    '''
+    if kwargs.get('two_phase'):
+        raise ValueError('two_phase does not fetch the geometry of every area, '
+                         'so it cannot be used with {}'.format(what))
+
+
+def _layer_defaults(layer):
+    '''
+    Return the default AreaFilter options for a layer
+    '''
+    # Block queries return many small areas, so overlay them in batches
+    if layer == 'blocks':
+        return {'batch_size': BATCH_SIZE}
+    return {}
+
+
+def _county_within(area):
+    feature, _ = area
+    return 'state:{STATE} county:{COUNTY}'.format(**feature['properties'])
+
+
+def _tract_within(area):
+    feature, _ = area
+    return 'state:{STATE} county:{COUNTY} tract:{TRACT}'.format(**feature['properties'])
+
+
+# Layer, Census API geography and parent geography clause of each
+# resolution, named for its geo_* method
+RESOLUTIONS = {'tract': ('tracts', 'tract', _county_within),
+               'blockgroup': ('block groups', 'block group', _tract_within),
+               'block': ('blocks', 'block', _tract_within)}
+
+
+# Years for which the geo_* method of each resolution is available
+RESOLUTION_YEARS = {'tract': (2024, 2023, 2022, 2021, 2020, 2019, 2018, 2017, 2016, 2015, 2014, 2013,
+                              2012, 2011, 2010, 2000),
+                    'blockgroup': (2024, 2023, 2022, 2021, 2020, 2019, 2018, 2017, 2016, 2015, 2014,
+                                   2013, 2012, 2011, 2010),
+                    'block': (2020, 2010)}
+
+# Resolutions at which variable values can be aggregated by geo, geo_many
+# and crosswalk
+AGGREGATE_RESOLUTIONS = ('tract', 'blockgroup')
+
+
+def _resolution(resolution):
+    try:
+        return RESOLUTIONS[resolution]
+    except KeyError:
+        raise ValueError('{} is not a valid resolution. Choose one of {}'.format(resolution, list(RESOLUTIONS)))
+
+
+def _aggregate_resolution(resolution, year):
+    '''
+    Check that variable values can be aggregated at a resolution for a
+    year, as geo_* would, and return its layer, Census API geography and
+    parent geography clause
+    '''
+    if resolution not in AGGREGATE_RESOLUTIONS:
+        raise ValueError('{} is not a valid resolution. Choose one of {}'.format(resolution,
+                                                                                list(AGGREGATE_RESOLUTIONS)))
+
+    _check_years(resolution, [year])
+
+    return RESOLUTIONS[resolution]
+
+
+def _check_years(resolution, years, client_years=None):
+    '''
+    Check that the units of a resolution, and the methods of a client
+    available in client_years if given, are available in each of several
+    years, and return the years as a list
+    '''
+    years = list(years)
+    for available in (RESOLUTION_YEARS[resolution], client_years):
+        if available is None:
+            continue
+        for year in years:
+            if int(year) not in available:
+                raise census.core.UnsupportedYearException(
+                    'Geography is not available in {}. Available years include {}'.format(year, available))
+
+    return years
+
+
+def _feature_geometries(geometries):
+    '''
+    Return an array of the shapely geometries of the features of a GeoJSON
+    FeatureCollection, or of a single GeoJSON geometry, repaired if
+    invalid and prepared
+    '''
+    if geometries.get('type') == 'FeatureCollection':
+        geojson_geometries = [feature['geometry'] for feature in geometries['features']]
+    else:
+        geojson_geometries = [geometries]
+
+    feature_geos = numpy.array([shapely.geometry.shape(geojson_geometry)
+                                for geojson_geometry in geojson_geometries])
+    invalid = ~shapely.is_valid(feature_geos)
+    feature_geos[invalid] = shapely.buffer(feature_geos[invalid], 0)
+    shapely.prepare(feature_geos)
+
+    return feature_geos
+
+
+def _coverage(feature_geos):
+    return shapely.geometry.mapping(shapely.union_all(feature_geos))
+
+
+def _check_joinable(feature_geos, kwargs):
+    if len(feature_geos) > 1:
+        _check_two_phase(kwargs, 'several geometries')
+
+
+def _join_features(area_filter, feature_geos):
+    '''
+    Join the areas of an AreaFilter for the union of the geometries in the
+    array feature_geos to those geometries, yielding each area with the
+    indices of the geometries it overlaps and the proportion of it that
+    overlaps each
+    '''
+    if len(feature_geos) == 1:
+        for area, intersection_proportion in area_filter:
+            yield area, (numpy.zeros(1, dtype=numpy.int64),
+                         numpy.array([intersection_proportion]))
+        return
+
+    # Overlaying the areas with the union would be thrown away, so the
+    # filter only supplies the candidates, which are overlaid with each
+    # geometry they intersect
+    tree = shapely.STRtree(feature_geos)
+    for area in area_filter.candidates():
+        area_geo = shapely.geometry.shape(area['geometry'])
+        indices = tree.query(area_geo, predicate='intersects')
+        proportions = _feature_proportions(area_geo, feature_geos[indices])
+
+        overlapping = proportions > 0.01
+        if not overlapping.any():
+            continue
+
+        if area_filter.tolerance:
+            error, = proportion_errors(numpy.array([area_geo]), area_filter.tolerance)
+            area['properties']['PROPORTION_ERROR'] = error
+        if area_filter.stats is not None:
+            area_filter.stats.add_areas('kept')
+
+        yield area, (indices[overlapping], proportions[overlapping])
+
+
+def _feature_proportions(area_geo, feature_geos):
+    '''
+    Compute the proportion of area_geo that overlaps with each geometry in
+    the array feature_geos, which should be prepared.
+    '''
+    proportions = numpy.ones(len(feature_geos))
+
+    boundary = ~shapely.contains(feature_geos, area_geo)
+    if boundary.any():
+        try:
+            intersections = shapely.intersection(feature_geos[boundary], area_geo)
+        except (shapely.errors.TopologicalError, shapely.errors.GEOSException):
+            intersections = shapely.intersection(feature_geos[boundary], area_geo.buffer(0))
+        proportions[boundary] = shapely.area(intersections) / area_geo.area
+
+    return proportions
+
+
+def _parent_groups(areas, parent_within):
+    '''
+    Group consecutive areas and their proportions by parent geography,
+    yielding the Census API clause of each parent with its areas
+    '''
+    return ((within, list(parent_areas))
+            for within, parent_areas
+            in itertools.groupby(areas, key=parent_within))
+
+
+def _unit_ids(geography, parent_areas):
+    return [area['properties'][UNIT_FIELDS[geography]]
+            for area, _ in parent_areas]
+
+
+def _unit_geo(geography, unit_ids, within):
+    '''
+    Build the Census API geography clause for several units of a geography
+    that share a parent geography
+    '''
+    if len(unit_ids) > MAX_LISTED_UNITS:
+        units = '*'
+    else:
+        units = ','.join(sorted(set(unit_ids)))
+
+    return {'for': '{}:{}'.format(geography, units),
+            'in': within}
+
+
+def _indexed(results):
+    return {_geoid(result): result for result in results}
+
+
+def _joined(parent_areas, units):
+    '''
+    Join the areas of a parent geography to their variable values, indexed
+    by GEOID, in the form yielded by the geo_* methods
+    '''
+    return [(area, units.get(_geoid(area['properties']), {}), intersection_proportion)
+            for area, intersection_proportion in parent_areas]
+
+
+def _geoid_parents(geography, geoids):
+    '''
+    Group the distinct GEOIDs of units of a geography by parent geography,
+    yielding the Census API clause of each parent with the ids of its units
+    '''
+    parent_length = PARENT_GEOID_LENGTHS[geography]
+    for parent_geoid, unit_geoids in itertools.groupby(sorted(set(geoids)),
+                                                       key=lambda geoid: geoid[:parent_length]):
+        yield _geoid_within(parent_geoid), [geoid[parent_length:] for geoid in unit_geoids]
+
+
+def _check_predicate_types(fields, predicate_types):
+    for field, predicate_type in zip(fields, predicate_types):
+        if predicate_type not in AGGREGATABLE_TYPES:
+            raise ValueError('{} is not a variable that can be aggregated your geography'.format(field))
+
+
+def _check_crosswalk(crosswalk, features=None):
+    '''
+    Check that a crosswalk is for the features of a FeatureCollection, or,
+    without features, for a single geometry
+    '''
+    if features is None:
+        if crosswalk.n_features != 1:
+            raise ValueError('The crosswalk is for {} geometries, use geo_many '
+                             'instead'.format(crosswalk.n_features))
+    elif crosswalk.n_features != len(features):
+        raise ValueError('The crosswalk is for {} geometries, not {}'.format(crosswalk.n_features,
+                                                                             len(features)))
+
+
+def _crosswalk_geography(crosswalk, year):
+    '''
+    Check that a crosswalk was built from a year's boundaries, and return
+    the Census API geography of its units
+    '''
+    layer, geography, _ = _aggregate_resolution(crosswalk.resolution, year)
+    if GEO_URLS[layer][year] != crosswalk.url:
+        raise ValueError('The crosswalk was built from {}, not from the {} '
+                         'boundaries for {}'.format(crosswalk.url, layer, year))
+
+    return geography
+
+
+def _years_layer(resolution, years, covering):
+    '''
+    Check that variable values can be aggregated at a resolution for each
+    of several years, and return the years and the resolution's layer
+    '''
+    if covering:
+        raise ValueError('covering cannot be used with years')
+
+    years = list(years)
+    for year in years:
+        _aggregate_resolution(resolution, year)
+
+    layer, _, _ = _resolution(resolution)
+    return years, layer
+
+
+def _check_covering(resolution):
+    if resolution != 'blockgroup':
+        raise ValueError('covering is only available at blockgroup resolution')
+
+
+def _remainder(geo, covered):
+    '''
+    Return the part of a shapely geometry outside the covered areas, as a
+    GeoJSON geometry, or None if there is none
+    '''
+    remainder = geo.difference(shapely.union_all(_geometries(area for area, _ in covered)))
+    if remainder.is_empty:
+        return None
+    return shapely.geometry.mapping(remainder)
+
+
+def _aggregate_units(fields, units, ignore_missing, weights):
+    '''
+    Aggregate the variable values of the units yielded by a geo_* method
+    '''
+    geoids, rows, proportions = [], [], []
+    for area, result, intersection_proportion in units:
+        geoids.append(_geoid(area['properties']))
+        rows.append(result)
+        proportions.append(intersection_proportion)
+
+    # The units are a crosswalk with a single geometry
+    crosswalk = Crosswalk(None, None, 1, geoids,
+                          numpy.zeros(len(rows)),
+                          numpy.arange(len(rows)),
+                          proportions)
+
+    aggregate, = _aggregate_rows(fields, crosswalk, rows, ignore_missing, weights)
+    return aggregate
+
+
+def _joined_aggregates(fields, resolution, geography, n_features, units, ignore_missing, weights):
+    '''
+    Aggregate variable values for each of n_features geometries from the
+    units joined to them, in the form yielded by _join_features with their
+    values added
+    '''
+    # Only the units' variable values are kept, as compact records, until
+    # every unit has been joined
+    records = RecordList(fields, geography)
+
+    def record_units():
+        for area, result, overlaps in units:
+            records.append(area, result)
+            yield area, overlaps
+
+    crosswalk = Crosswalk.from_joined(resolution, None, n_features, record_units())
+    return _aggregate_records(fields, crosswalk, records, ignore_missing, weights)
+
+
+def _place_results(fields, geography, places, units, return_geometry):
+    '''
+    Put together the units joined to the places of a state, in a
+    dictionary by place FIPS code
+    '''
+    # Units are kept once, as compact records, however many places they
+    # overlap, until the results are put together
+    records = RecordList(fields, geography, geometry=return_geometry)
+    place_records = {place['properties']['PLACE']: [] for place in places}
+    for area, result, (indices, _) in units:
+        record = records.append(area, result)
+        for index in indices:
+            place_records[places[index]['properties']['PLACE']].append(record)
+
+    if return_geometry:
+        return {place: {'type': "FeatureCollection",
+                        'features': [records.feature(record) for record in unit_records]}
+                for place, unit_records in place_records.items()}
+    else:
+        return {place: [records.result(record) for record in unit_records]
+                for place, unit_records in place_records.items()}
+
+
+def _places(place_dumper, message):
+    '''
+    List the places a place dumper returns, raising a ValueError with
+    message if there are none
+    '''
+    try:
+        places = list(place_dumper)
+    except TypeError as e:
+        if "'<' not supported between instances of 'NoneType' and 'NoneType'" in str(e):
+            raise ValueError(message)
+
+        raise e
+
+    if not places:
+        raise ValueError(message)
+
+    return places
+
+
+def _place_vintage(layer, year):
+    '''
+    Return the tigerweb layers of a year's place and unit boundaries
+    '''
+    return _vintage('incorporated places', year), _vintage(layer, year)
+
+
+def _vintage_records(areas, geography, return_geometry):
+    records = RecordList((), geography, geometry=return_geometry)
+    for area, intersection_proportion in areas:
+        records.append(area, proportion=intersection_proportion)
+    return records
+
+
+def _record_areas(records):
+    # Each year gets its own copy of the areas to add its values to
+    return ((records.area(record), record.proportion) for record in records)
+
+
+def _aggregate_rows(fields, crosswalk, rows, ignore_missing, weights):
+    '''
+    Aggregate the Census API rows of the units of a crosswalk for each of
+    its geometries, and return a list with a dictionary of aggregated
+    values for each
+    '''
+    values = numpy.array([[numpy.nan if row.get(field) is None else row[field]
+                           for field in fields]
+                          for row in rows], dtype=float).reshape(len(rows), len(fields))
+
+    return _aggregate_values(fields, crosswalk, values, rows.__getitem__, ignore_missing, weights)
+
+
+def _aggregate_records(fields, crosswalk, records, ignore_missing, weights):
+    '''
+    Like _aggregate_rows, for units kept in a RecordList with the same
+    fields
+    '''
+    no_values = numpy.full(len(fields), numpy.nan)
+    values = numpy.array([no_values if record.values is None else record.values
+                          for record in records], dtype=float).reshape(len(records), len(fields))
+
+    return _aggregate_values(fields, crosswalk, values,
+                             lambda unit: records.result(records[unit]),
+                             ignore_missing, weights)
+
+
+def _aggregate_values(fields, crosswalk, values, row, ignore_missing, weights):
+    '''
+    Aggregate a units by fields array of values for each geometry of a
+    crosswalk. row(unit) returns the Census API row of a unit, for weights
+    that are functions of it.
+    '''
+    missing = numpy.isnan(values).any(axis=1)
+    if ignore_missing:
+        values[missing] = 0.0
+
+    if weights is None:
+        entry_weights = None
+    elif weights == 'area':
+        entry_weights = crosswalk.proportions
+    else:
+        entry_weights = numpy.array([weights(row(unit), intersection_proportion)
+                                     for unit, intersection_proportion
+                                     in zip(crosswalk.units, crosswalk.proportions)],
+                                    dtype=float)
+
+    totals = _sum_fields(fields, values, crosswalk, entry_weights)
+    aggregates = [dict(zip(fields, feature_totals)) for feature_totals in totals.tolist()]
+
+    # Unweighted sums of whole number estimates are counts, and are
+    # returned as ints, as the estimates of a single area are
+    if weights is None:
+        counts = [field for i, field in enumerate(fields)
+                  if field.endswith('E') and numpy.all(values[:, i] == numpy.round(values[:, i]))]
+        for aggregate in aggregates:
+            for field in counts:
+                aggregate[field] = int(aggregate[field])
+
+    return aggregates
+
+
+def _sum_fields(fields, values, crosswalk, weights):
+    '''
+    Sum the estimates, and compute the margin of error of the sum of the
+    margins of error, in a units by fields array of values for each
+    geometry of a crosswalk.
+
+    Following the Census Bureau's guidance for ACS margins of error, only
+    the largest margin of error of the units with an estimate of zero is
+    counted.
+    '''
+    estimates, moes = [], []
+    for i, field in enumerate(fields):
+        if field.endswith('E'):
+            estimates.append(i)
+        elif field.endswith('M'):
+            moes.append(i)
+        else:
+            raise ValueError("Don't know how to aggregate this variable {}".format(field))
+
+    totals = numpy.zeros((crosswalk.n_features, len(fields)))
+    totals[:, estimates] = crosswalk.dot(values[:, estimates], weights)
+
+    if moes:
+        squared = values[:, moes] ** 2
+        squared_weights = weights ** 2 if weights is not None else None
+
+        zero = numpy.zeros(squared.shape, dtype=bool)
+        for j, i in enumerate(moes):
+            e_field = fields[i][:-1] + 'E'
+            if e_field in fields:
+                zero[:, j] = values[:, fields.index(e_field)] == 0
+
+        nonzero_sum = crosswalk.dot(numpy.where(zero, 0.0, squared), squared_weights)
+        zero_max = crosswalk.max(numpy.where(zero, squared, 0.0), squared_weights)
+        totals[:, moes] = numpy.sqrt(nonzero_sum + zero_max)
+
+    return totals
+
+
+def _vintage(layer, year):
+    '''
+    Return the tigerweb layer holding a year's boundaries
+    '''
+    try:
+        return GEO_URLS[layer][year]
+    except KeyError:
+        raise census.core.UnsupportedYearException(
+            'Geography is not available in {}. Available years include {}'.format(year, sorted(GEO_URLS[layer])))
+
+
+def _features(areas, return_geometry):
+    '''
+    Yield the variable values of areas yielded by a geo_* method, or, with
+    return_geometry, the areas as GeoJSON features with the values added to
+    their properties
+    '''
+    for i, (feature, result, _) in enumerate(areas):
+        if return_geometry:
+            feature['properties'].update(result)
+            yield feature
+        else:
+            yield result
+        if i % 100 == 0:
+            logging.info('{} features'.format(i))
+
+
+def _collect(areas, return_geometry, stream=False):
+    '''
+    Collect the variable values of areas yielded by a geo_* method into a
+    list, or, with return_geometry, into a FeatureCollection of the areas.
+    With stream, return a generator of them instead.
+    '''
+    features = _features(areas, return_geometry)
+    if stream:
+        return features
+
+    if return_geometry:
+        return {'type': "FeatureCollection", 'features': list(features)}
+    else:
+        return list(features)
+
+
+def _geoid_within(parent_geoid):
+    '''
+    Build the Census API 'in' clause of a parent geography from its GEOID
+    '''
+    within = 'state:{} county:{}'.format(parent_geoid[:2], parent_geoid[2:5])
+    if len(parent_geoid) > 5:
+        within += ' tract:{}'.format(parent_geoid[5:11])
+    return within
+
+
+def _geoid(row):
+    '''
+    Build the GEOID of a tigerweb feature's properties or of a Census API
+    result row
+    '''
+    if 'STATE' in row:
+        keys = ('STATE', 'COUNTY', 'TRACT', 'BLKGRP', 'BLOCK')
+    else:
+        keys = ('state', 'county', 'tract', 'block group', 'block')
+
+    # A block's id starts with the id of its block group
+    if keys[-1] in row:
+        keys = keys[:3] + keys[-1:]
+
+    return ''.join(row[key] for key in keys if key in row)
+
+
+def _place_query_args(criteria):
+    '''
+    Build the tigerweb query arguments for the incorporated places whose
+    properties have the given values
+    '''
+    search_query = ' AND '.join("{}='{}'".format(field, value)
+                                for field, value in criteria.items())
+    return {'where': search_query,
+            'orderByFields': 'OID'}
+
+
+def _retry_delay(status, attempt, retries):
+    '''
+    Return the seconds to wait before retrying a Census API request that
+    got a response with status on its attempt-th try, or None if it should
+    not be retried
+    '''
+    if status not in RETRY_STATUSES or attempt >= retries:
+        return None
+    return RETRY_BACKOFF * 2 ** attempt
+
+
+def _census_data(response):
+    '''
+    Return the header and the rows of a Census API response, raising
+    errors as census.core.Client.query does
+    '''
+    if response.status_code == 204:
+        return [], []
 
-        geo_query_args = {'geometry': ','.join(str(x) for x in self.geo.bounds),
-                          'geometryType': 'esriGeometryEnvelope',
-                          'spatialRel': 'esriSpatialRelEnvelopeIntersects',
-                          'inSR': '4326',
-                          'geometryPrecision': 9,
-                          'orderByFields': 'STATE,COUNTY,TRACT,OID'}
-        self.area_dumper = esridump.EsriDumper(sub_geography_url,
-                                               extra_query_args=geo_query_args)
+    text = response.content.decode('utf-8', 'replace')
+    if response.status_code != 200:
+        raise census.core.CensusException(text)
+
+    try:
+        headers, *data = json.loads(response.content)
+    except ValueError:
+        if '<title>Invalid Key</title>' in text:
+            raise census.core.APIKeyError(' '.join(text.splitlines()))
+        raise
+
+    return headers, data
+
+
+def _field_chunks(fields, year):
+    '''
+    Split fields into the chunks requested at a time, as
+    census.core.Client.get does, and return them with whether each chunk's
+    rows are sorted by GEO_ID to be merged
+    '''
+    sort_by_geoid = len(fields) > 49 and (not year or year > 2009)
+    return list(census.core.chunks(fields, 49)), sort_by_geoid
+
+
+def _merged(chunk_results):
+    return [census.core.merge(result) for result in zip(*chunk_results)]
+
+
+def _census_rows(headers, data, types, sort_by_geoid):
+    '''
+    Build the result dictionaries of the rows of a Census API response,
+    casting each value to the type of its variable
+    '''
+    results = [{header: (cast(item) if item is not None else None)
+                for header, cast, item
+                in zip(headers, types, row)}
+               for row in data]
+
+    if sort_by_geoid:
+        results.sort(key=lambda result: result['GEO_ID'])
+
+    return results
+
+
+def _predicate_type(response):
+    '''
+    Return the predicate type in the response to a Census API variable
+    definition request
+    '''
+    if response.status_code != 200:
+        return 'string'
+    return json.loads(response.content).get('predicateType', 'string')
+
+
+def _log_proportion_error(features):
+    max_error = 0.0
+    for feature in features:
+        max_error = max(max_error, feature[0]['properties'].get('PROPORTION_ERROR', 0.0))
+        yield feature
+
+    logging.info('Area proportions are within {:.4f} of their exact values'.format(max_error))
+
+
+class RateLimiter(object):
+    '''
+    Space out calls to wait(), from any number of threads, so that at most
+    `rate` of them return each second
+    '''
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def reserve(self):
+        '''
+        Reserve the next call, and return the seconds to wait before making
+        it
+        '''
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+
+        return delay
 
-    def __iter__(self):
-        for area in self.area_dumper:
-            area_geo = shapely.geometry.shape(area['geometry'])
-            if self.geo.intersects(area_geo):
-                try:
-                    intersection = self.geo.intersection(area_geo)
-                except shapely.geos.TopologicalError:
-                    intersection = self.geo.buffer(0).intersection(area_geo.buffer(0))
-                intersection_proportion = intersection.area / area_geo.area
-                if intersection_proportion > 0.01:
-                    yield area, intersection_proportion
 
+def census_session(retries=3, max_workers=None):
+    '''
+    Create a requests session for Census API clients, which retries
+    requests that fail to connect, and keeps a connection open for each of
+    max_workers threads.
 
-class HashDict(dict):
+    Requests that fail with a 429 or 5xx status reached the API, so they
+    are retried by the client instead, through its rate limiter.
+    '''
+    retry = urllib3.util.Retry(total=retries,
+                               read=0,
+                               backoff_factor=RETRY_BACKOFF,
+                               allowed_methods=['GET'])
+    adapter = requests.adapters.HTTPAdapter(max_retries=retry,
+                                            pool_maxsize=max(max_workers or 1, 10))
 
-    def __hash__(self):
-        return hash(tuple(self.items()))
+    session = census.core.new_session()
+    session.mount('https://api.census.gov', adapter)
+    return session
 
 
 class GeoClient(census.core.Client):
+    '''
+    Census API client with methods for arbitrary geographies.
+
+    Responses are cached in response_cache, a ResponseCache, which can be
+    shared between clients and, with a disk tier, between processes. By
+    default each client keeps its own in-memory cache.
+
+    With max_workers set, the geo_* methods send their Census API requests
+    from that many threads, while still yielding areas in order. Requests
+    that fail with a 429 or 5xx status are retried up to retries times
+    with exponential backoff. Requests, retries included, are limited to
+    requests_per_second, if set, or by rate_limiter, a RateLimiter that
+    clients using the same API key can share. Unless a session is passed
+    in, the client creates one with census_session; a session passed in is
+    used as it is.
+
+    With pipeline set, the geo_* methods run as a pipeline: areas are
+    downloaded from tigerweb in a background thread while earlier areas
+    are overlaid, and the Census API requests for areas that have been
+    overlaid are sent ahead of yielding them. Each stage only runs a
+    bounded distance ahead of the next.
+
+    Call close(), or use the client as a context manager, to stop its
+    threads when done with it.
+    '''
+    # Years for which the state_place* methods are available, or None for
+    # any year
+    place_years = None
+
+    def __init__(self, key, year=None, session=None, retries=3, response_cache=None,
+                 max_workers=None, requests_per_second=None, pipeline=False, rate_limiter=None):
+        # A session passed in may be shared, and is used as it is
+        self._owns_session = session is None
+        if session is None:
+            session = census_session(retries, max_workers)
+        super().__init__(key, year, session, retries)
+        if response_cache is None:
+            response_cache = ResponseCache()
+        self.response_cache = response_cache
+
+        self.max_workers = max_workers
+        self.pipeline = pipeline
+        self._executor = None
+
+        if rate_limiter is None and requests_per_second:
+            rate_limiter = RateLimiter(requests_per_second)
+        self.rate_limiter = rate_limiter
+
+        self._predicate_types = {}
+
+    def close(self):
+        '''
+        Stop the client's threads, and close its session if it created it
+        '''
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @census.core.retry_on_transient_error
+    def query(self, fields, geo, year=None, sort_by_geoid=False, stats=None, **kwargs):
+        '''
+        Request variable values from the Census API, as
+        census.core.Client.query does, through the client's rate limiter
+        and retries, recording the responses in stats, if set
+        '''
+        if year is None:
+            year = self.default_year
+
+        url, params = self._census_query(fields, geo, year, sort_by_geoid)
+        headers, data = _census_data(self._census_response(url, params, stats))
+        types = [PREDICATE_TYPES.get(self._predicate_type(header, year, stats), str)
+                 for header in headers]
+
+        return _census_rows(headers, data, types, sort_by_geoid)
+
+    def _census_query(self, fields, geo, year, sort_by_geoid):
+        '''
+        Return the URL and parameters of a Census API request for variable
+        values
+        '''
+        fields = list(census.core.list_or_str(fields))
+        if sort_by_geoid:
+            fields.append('GEO_ID')
+
+        params = {'get': ','.join(fields),
+                  'for': geo['for'],
+                  'key': self._key}
+        if 'in' in geo:
+            params['in'] = geo['in']
+
+        return self._census_url('endpoint_url', year) % (year, self.dataset), params
+
+    def _census_url(self, name, year):
+        '''
+        Return one of the client's Census API URL templates for a year
+        '''
+        # ACS clients pick their URLs by year
+        if hasattr(self, '_switch_endpoints'):
+            self._switch_endpoints(year)
+        return getattr(self, name)
+
+    def _census_response(self, url, params, stats=None):
+        '''
+        Send a Census API request through the rate limiter, and retry it
+        with exponential backoff if it fails with a 429 or 5xx status
+        '''
+        for attempt in itertools.count():
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+
+            response = self.session.get(url, params=params)
+            if stats is not None:
+                stats.add_request(response.url, len(response.content))
+
+            delay = _retry_delay(response.status_code, attempt, self.retries)
+            if delay is None:
+                return response
+            time.sleep(delay)
+
+    def _field_type(self, field, year):
+        return PREDICATE_TYPES.get(self._predicate_type(field, year), str)
+
+    def _predicate_type(self, field, year, stats=None):
+        '''
+        Look up the predicate type of a Census API variable, once for each
+        year
+        '''
+        key = (field, year)
+        if key not in self._predicate_types:
+            url, params = self._definition_query(field, year)
+            self._predicate_types[key] = _predicate_type(self._census_response(url, params, stats))
 
-    @lru_cache
-    def get(self, *args, **kwargs):
-        return super().get(*args, **kwargs)
+        return self._predicate_types[key]
+
+    def _definition_query(self, field, year):
+        '''
+        Return the URL and parameters of a Census API request for a
+        variable's definition
+        '''
+        return self._census_url('definition_url', year) % (year, self.dataset, field), {'key': self._key}
+
+    def _area_filter(self, geojson_geometry, layer, year, kwargs, **defaults):
+        '''
+        Build an AreaFilter for a layer from the AreaFilter options in
+        kwargs, which are removed from it, falling back on defaults and the
+        layer's defaults
+        '''
+        options = _layer_defaults(layer)
+        options.update(defaults)
+        if self.pipeline:
+            options['prefetch'] = PIPELINE_SIZE
+        options.update(_area_filter_options(kwargs))
+
+        return AreaFilter(geojson_geometry, GEO_URLS[layer][year], **options)
+
+    def _map(self, func, items):
+        '''
+        Yield each item with func(item), calling func from max_workers
+        threads if set, in the order of the items
+        '''
+        if not self.pipeline and (not self.max_workers or self.max_workers < 2):
+            for item in items:
+                yield item, func(item)
+            return
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(self.max_workers or 1)
+
+        yield from _map_ahead(self._executor,
+                              func,
+                              items,
+                              lambda item: (item,),
+                              ahead=2 * (self.max_workers or 1))
+
+    def get(self, fields, geo, year=None, **kwargs):
+        if year is None:
+            year = self.default_year
+
+        fields = census.core.list_or_str(fields)
+        stats = kwargs.pop('stats', None)
+
+        results = self.response_cache.get(self.dataset, year, fields, geo)
+        if stats is not None:
+            stats.add_cache(results is not None)
+
+        if results is None:
+            start = time.monotonic()
+            try:
+                chunks, sort_by_geoid = _field_chunks(fields, year)
+                results = _merged([self.query(chunk, geo, year, sort_by_geoid=sort_by_geoid,
+                                              stats=stats, **kwargs)
+                                   for chunk in chunks])
+            finally:
+                if stats is not None:
+                    stats.add_time('census', time.monotonic() - start)
+            self.response_cache.set(self.dataset, year, fields, geo, results)
+
+        return results
 
     def state_place_tract(self, *args, **kwargs):
         '''
@@ -69,12 +1673,18 @@ class GeoClient(census.core.Client):
         * year (int) - data year
         * return_geometry (bool) - set True to return results as GeoJSON like
           object (default: False)
+        * years (iterable) - retrieve values for each of these years instead
+          of for year, overlaying the place once for each set of boundaries
+          the years share, and return the results in a dictionary by year
+        * stream (bool) - return a generator yielding the results as they
+          are produced, instead of collecting them, for instance to write
+          them out with census_area.output (default: False)
 
         Returns:
 
         List with dictionary for each tract containing variable values.
         '''
-        return self._state_place_area(self.geo_tract, *args, **kwargs)
+        return self._state_place_area('tract', *args, **kwargs)
 
     def state_place_blockgroup(self, *args, **kwargs):
         '''
@@ -91,14 +1701,64 @@ class GeoClient(census.core.Client):
         * year (int) - data year
         * return_geometry (bool) - set True to return results as GeoJSON like
           object (default: False)
+        * years (iterable) - retrieve values for each of these years instead
+          of for year, overlaying the place once for each set of boundaries
+          the years share, and return the results in a dictionary by year
+        * stream (bool) - return a generator yielding the results as they
+          are produced, instead of collecting them, for instance to write
+          them out with census_area.output (default: False)
 
         Returns:
 
         List with dictionary for each block group containing variable values.
         '''
-        return self._state_place_area(self.geo_blockgroup, *args, **kwargs)
+        return self._state_place_area('blockgroup', *args, **kwargs)
+
+    def state_places_tract(self, *args, **kwargs):
+        '''
+        Retrieve variable values for tracts in every incorporated place of
+        the specified state, with one query for the places and one overlay
+        for all of them.
+
+        Arguments:
+
+        * fields (iterable) - Variables to retrieve
+        * state (int or str) - state FIPS code (see
+          https://www.census.gov/library/reference/code-lists/ansi.html#state)
+        * year (int) - data year
+        * return_geometry (bool) - set True to return results as GeoJSON like
+          objects (default: False)
+
+        Returns:
+
+        Dictionary with, for each place FIPS code, a list with dictionary for
+        each tract in the place containing variable values.
+        '''
+        return self._state_places_area('tract', *args, **kwargs)
+
+    def state_places_blockgroup(self, *args, **kwargs):
+        '''
+        Retrieve variable values for block groups in every incorporated place of
+        the specified state, with one query for the places and one overlay
+        for all of them.
+
+        Arguments:
+
+        * fields (iterable) - Variables to retrieve
+        * state (int or str) - state FIPS code (see
+          https://www.census.gov/library/reference/code-lists/ansi.html#state)
+        * year (int) - data year
+        * return_geometry (bool) - set True to return results as GeoJSON like
+          objects (default: False)
+
+        Returns:
+
+        Dictionary with, for each place FIPS code, a list with dictionary for
+        each block group in the place containing variable values.
+        '''
+        return self._state_places_area('blockgroup', *args, **kwargs)
 
-    @supported_years(2024, 2023, 2022, 2021, 2020, 2019, 2018, 2017, 2016, 2015, 2014, 2013, 2012, 2011, 2010, 2000)
+    @supported_years(*RESOLUTION_YEARS['tract'])
     def geo_tract(self, fields, geojson_geometry, year=None, **kwargs):
         '''
         Retrieve variable values for tracts intersecting with an arbitrary
@@ -109,6 +1769,32 @@ class GeoClient(census.core.Client):
         * fields (iterable) - Variables to retrieve
         * geojson_geometry (dict) - Geometry object in ESPG:4326
         * year (int) - data year
+        * batch_size (int) - overlay this many areas at a time with
+          vectorized operations (default: one at a time)
+        * workers (int) - overlay batches of areas in this many processes
+        * max_tiles (int) - query tigerweb with up to this many tiles
+          covering the geometry (default: 16)
+        * spatial_filter (str) - 'polygon' to query tigerweb with simplified
+          polygons covering the geometry instead of envelopes
+        * max_query_size (int) - maximum size, in characters, of each
+          polygon sent to tigerweb (default: 4000)
+        * two_phase (bool) - fetch geometry only for areas near the
+          boundary of the geometry; areas within it are yielded without
+          geometry (default: False)
+        * approximate (bool) - have tigerweb return generalized areas, and
+          add a PROPORTION_ERROR bound to each area's properties
+        * tolerance (float) - generalization of the areas, in degrees
+          (default with approximate: 0.0001)
+        * store (BoundaryStore) - read areas from this store instead of
+          tigerweb
+        * cache (SQLiteCache) - reuse areas fetched from tigerweb by earlier
+          identical queries
+        * prefetch (int) - download up to this many areas ahead of the
+          overlay in a background thread
+        * checkpoint (Checkpoint) - record progress in this checkpoint, and
+          resume from it if the same query was interrupted
+        * stats (Stats) - record requests, areas, cache hits and the time
+          spent in each stage in this Stats
 
         Returns:
 
@@ -119,29 +1805,85 @@ class GeoClient(census.core.Client):
         if year is None:
             year = self.default_year
 
-        filtered_tracts = AreaFilter(geojson_geometry,
-                                     GEO_URLS['tracts'][year])
+        return self._geo_units(fields, geojson_geometry, 'tract', year, kwargs)
+
+    def _geo_units(self, fields, geojson_geometry, resolution, year, kwargs):
+        '''
+        Yield the units of a resolution that overlap with a geometry, each
+        with its variable values and proportion, resuming from a checkpoint
+        if one is given in kwargs
+        '''
+        layer, geography, parent_within = _resolution(resolution)
+
+        checkpoint = kwargs.pop('checkpoint', None)
+        if checkpoint is None:
+            areas = self._area_filter(geojson_geometry, layer, year, kwargs)
+            return self._join_units(fields, areas, geography, parent_within, year, **kwargs)
+
+        job = job_key(self.dataset, resolution, year, list(fields), geojson_geometry,
+                      {option: value for option, value in kwargs.items()
+                       if option in RESULT_OPTIONS
+                       or option not in AREA_FILTER_OPTIONS + ('stats',)})
+
+        return self._checkpointed(fields, geojson_geometry, layer, geography, parent_within, year,
+                                  checkpoint, job, kwargs)
+
+    def _checkpointed(self, fields, geojson_geometry, layer, geography, parent_within, year,
+                      checkpoint, job, kwargs):
+        for _, units in checkpoint.batches(job):
+            for area, result, intersection_proportion in units:
+                yield area, result, intersection_proportion
+
+        if checkpoint.is_finished(job):
+            return
+
+        after = checkpoint.last(job)
+        if after is not None:
+            logging.info('Resuming after {}'.format(' '.join(after)))
+
+        areas = self._area_filter(geojson_geometry, layer, year, kwargs, after=after)
+        parent_fields = PARENT_FIELDS[geography]
+
+        # Each parent's units are stored before the values of the next
+        # parent's are asked for, so a failed request loses no finished
+        # parent
+        for parent_units in self._join_parents(fields, areas, geography, parent_within, year, **kwargs):
+            (area, _, _), *_ = parent_units
+            parent = tuple(area['properties'][field] for field in parent_fields)
+            checkpoint.add(job, parent, parent_units)
+            yield from parent_units
 
-        for tract, intersection_proportion in filtered_tracts:
-            context = {'state': tract['properties']['STATE'],
-                       'county': tract['properties']['COUNTY']}
-            within = 'state:{state} county:{county}'.format(**context)
+        checkpoint.finish(job)
 
-            tract_id = tract['properties']['TRACT']
-            result = self.get(fields,
-                              HashDict({'for': 'tract:{}'.format(tract_id),
-                                        'in': within}),
-                              year,
-                              **kwargs)
+    def _join_units(self, fields, areas, geography, parent_within, year, **kwargs):
+        '''
+        Yield each area with its variable values and proportion, requesting
+        the values for the areas that share a parent geography at once
+        '''
+        for parent_units in self._join_parents(fields, areas, geography, parent_within, year, **kwargs):
+            yield from parent_units
+
+    def _join_parents(self, fields, areas, geography, parent_within, year, **kwargs):
+        '''
+        Yield a list of the joined areas of each parent geography, in the
+        form yielded by _join_units
+        '''
+        def fetch(parent):
+            within, parent_areas = parent
+            return self._unit_index(fields, geography, _unit_ids(geography, parent_areas),
+                                    within, year, **kwargs)
 
-            if result:
-                result, = result
-            else:
-                result = {}
+        for (_, parent_areas), units in self._map(fetch, _parent_groups(areas, parent_within)):
+            yield _joined(parent_areas, units)
 
-            yield tract, result, intersection_proportion
+    def _unit_index(self, fields, geography, unit_ids, within, year, **kwargs):
+        '''
+        Retrieve variable values for several units of a geography that share
+        a parent geography with a single request, and index them by GEOID.
+        '''
+        return _indexed(self.get(fields, _unit_geo(geography, unit_ids, within), year, **kwargs))
 
-    @supported_years(2024, 2023, 2022, 2021, 2020, 2019, 2018, 2017, 2016, 2015, 2014, 2013, 2012, 2011, 2010)
+    @supported_years(*RESOLUTION_YEARS['blockgroup'])
     def geo_blockgroup(self, fields, geojson_geometry, year=None, **kwargs):
         '''
         Retrieve variable values for block groups intersecting with an arbitrary
@@ -152,6 +1894,32 @@ class GeoClient(census.core.Client):
         * fields (iterable) - Variables to retrieve
         * geojson_geometry (dict) - Geometry object in ESPG:4326
         * year (int) - data year
+        * batch_size (int) - overlay this many areas at a time with
+          vectorized operations (default: one at a time)
+        * workers (int) - overlay batches of areas in this many processes
+        * max_tiles (int) - query tigerweb with up to this many tiles
+          covering the geometry (default: 16)
+        * spatial_filter (str) - 'polygon' to query tigerweb with simplified
+          polygons covering the geometry instead of envelopes
+        * max_query_size (int) - maximum size, in characters, of each
+          polygon sent to tigerweb (default: 4000)
+        * two_phase (bool) - fetch geometry only for areas near the
+          boundary of the geometry; areas within it are yielded without
+          geometry (default: False)
+        * approximate (bool) - have tigerweb return generalized areas, and
+          add a PROPORTION_ERROR bound to each area's properties
+        * tolerance (float) - generalization of the areas, in degrees
+          (default with approximate: 0.0001)
+        * store (BoundaryStore) - read areas from this store instead of
+          tigerweb
+        * cache (SQLiteCache) - reuse areas fetched from tigerweb by earlier
+          identical queries
+        * prefetch (int) - download up to this many areas ahead of the
+          overlay in a background thread
+        * checkpoint (Checkpoint) - record progress in this checkpoint, and
+          resume from it if the same query was interrupted
+        * stats (Stats) - record requests, areas, cache hits and the time
+          spent in each stage in this Stats
 
         Returns:
 
@@ -162,120 +1930,356 @@ class GeoClient(census.core.Client):
         if year is None:
             year = self.default_year
 
-        filtered_block_groups = AreaFilter(geojson_geometry,
-                                           GEO_URLS['block groups'][year])
+        return self._geo_units(fields, geojson_geometry, 'blockgroup', year, kwargs)
+
+    def _state_place_area(self, resolution, fields, state, place, year=None, return_geometry=False,
+                          years=None, stream=False, **kwargs):
+        if year is None:
+            year = self.default_year
+
+        if return_geometry:
+            _check_two_phase(kwargs, 'return_geometry')
+
+        if years is not None:
+            return self._state_place_years(resolution, fields, state, place, years,
+                                           return_geometry, stream, kwargs)
+
+        place_geojson = self._place_geometry(state, place, year, kwargs)
+
+        method = getattr(self, 'geo_' + resolution)
+        areas = method(fields, place_geojson, year=year, **kwargs)
+
+        return _collect(areas, return_geometry, stream)
+
+    def _state_place_years(self, resolution, fields, state, place, years, return_geometry, stream,
+                           kwargs):
+        '''
+        Retrieve variable values for the units of a place for several years,
+        overlaying the place with the units once for each distinct pair of
+        place and unit boundaries, and return them indexed by year
+        '''
+        layer, geography, parent_within = _resolution(resolution)
+        years = _check_years(resolution, years, self.place_years)
+        options = _area_filter_options(kwargs)
+
+        vintages = {}
+        results = {}
+        for year in years:
+            vintage = _place_vintage(layer, year)
+            if vintage not in vintages:
+                place_geojson = self._place_geometry(state, place, year, options)
+                areas = self._area_filter(place_geojson, layer, year, dict(options))
+                vintages[vintage] = _vintage_records(areas, geography, return_geometry)
+
+            units = self._join_units(fields, _record_areas(vintages[vintage]), geography,
+                                     parent_within, year, **kwargs)
+            results[year] = _collect(units, return_geometry, stream)
+
+        return results
+
+    def _place_geometry(self, state, place, year, kwargs, dumper=None):
+        '''
+        Fetch the GeoJSON geometry of an incorporated place, from the store or
+        cache in kwargs if given
+        '''
+        place, *_ = _places(self._place_dumper(year, kwargs, dumper, PLACE=place, STATE=state),
+                            f'Could not find specified place "{place}" in state "{state}"')
+
+        logging.info(place['properties']['NAME'])
+        return place['geometry']
+
+    def _state_places(self, state, year, kwargs, dumper=None):
+        '''
+        Fetch the incorporated places of a state, from the store or cache in
+        kwargs if given
+        '''
+        places = _places(self._place_dumper(year, kwargs, dumper, STATE=state),
+                         f'Could not find any places in state "{state}"')
+
+        logging.info('{} places'.format(len(places)))
+        return places
+
+    def _place_dumper(self, year, kwargs, dumper=None, **criteria):
+        '''
+        Iterate over the incorporated places whose properties have the given
+        values, from the store or cache in kwargs if given
+        '''
+        place_url = GEO_URLS['incorporated places'][year]
+
+        store = kwargs.get('store')
+        if store is not None:
+            return store.where(place_url, **criteria)
 
-        for block_group, intersection_proportion in filtered_block_groups:
-            context = {'state': block_group['properties']['STATE'],
-                       'county': block_group['properties']['COUNTY'],
-                       'tract': block_group['properties']['TRACT']}
-            within = 'state:{state} county:{county} tract:{tract}'.format(**context)
+        query_args = _place_query_args(criteria)
+        place_dumper = (dumper or _esri_dumper)(place_url,
+                                                kwargs.get('stats'),
+                                                extra_query_args=query_args)
 
-            tract_blockgroups = self.get(fields,
-                                         HashDict({'for': 'block group:*',
-                                                   'in':  within}),
-                                         year,
-                                         **kwargs)
+        cache = kwargs.get('cache')
+        if cache is not None:
+            place_dumper = _cached(cache, place_dumper, _cache_key(place_url, query_args))
 
-            result = [result for result in tract_blockgroups
-                      if result['block group'] == block_group['properties']['BLKGRP']]
+        return place_dumper
 
-            if result:
-                result, = result
-            else:
-                result = {}
+    def _feature_areas(self, geometries, layer, year, kwargs, **defaults):
+        '''
+        Overlay the union of a geometry, or of the features of a
+        FeatureCollection, with the areas of a layer, and return the
+        features' shapely geometries and the areas joined to them
+        '''
+        feature_geos = _feature_geometries(geometries)
+        _check_joinable(feature_geos, kwargs)
 
-            yield block_group, result, intersection_proportion
+        areas = self._area_filter(_coverage(feature_geos), layer, year, kwargs, **defaults)
+        return feature_geos, _join_features(areas, feature_geos)
 
-    def _state_place_area(self, method, fields, state, place, year=None, return_geometry=False, **kwargs):
+    def _state_places_area(self, resolution, fields, state, year=None, return_geometry=False, **kwargs):
+        '''
+        Retrieve variable values for the units of every incorporated place in
+        a state, overlaying all the places with the units at once, and return
+        them in a dictionary by place FIPS code
+        '''
         if year is None:
             year = self.default_year
 
-        search_query = "PLACE='{}' AND STATE='{}'".format(place, state)
-        place_dumper = esridump.EsriDumper(GEO_URLS['incorporated places'][year],
-                                           extra_query_args={'where': search_query,
-                                                             'orderByFields': 'OID'})
+        if return_geometry:
+            _check_two_phase(kwargs, 'return_geometry')
 
-        try:
-            place = next(iter(place_dumper))
-        except TypeError as e:
-            if "'<' not supported between instances of 'NoneType' and 'NoneType'" in str(e):
-                raise ValueError(f'Could not find specified place "{place}" in state "{state}"')
+        layer, geography, parent_within = _resolution(resolution)
 
-            raise e
+        places = self._state_places(state, year, kwargs)
+        _, joined = self._feature_areas({'type': 'FeatureCollection', 'features': places},
+                                        layer, year, kwargs)
+        units = self._join_units(fields, joined, geography, parent_within, year, **kwargs)
 
-        logging.info(place['properties']['NAME'])
-        place_geojson = place['geometry']
+        return _place_results(fields, geography, places, units, return_geometry)
 
-        areas = method(fields, place_geojson, year=year, **kwargs)
+    def geo(self, fields, geojson_geometry, year=None, resolution='tract', ignore_missing = False,
+            crosswalk=None, weights=None, covering=False, years=None, **kwargs):
+        '''
+        Aggregate variable values within an arbitrary geometry.
 
-        features = []
-        for i, (feature, result, _) in enumerate(areas):
-            if return_geometry:
-                feature['properties'].update(result)
-                features.append(feature)
-            else:
-                features.append(result)
-            if i % 100 == 0:
-                logging.info('{} features'.format(i))
+        Arguments:
 
-        if return_geometry:
-            return {'type': "FeatureCollection", 'features': features}
-        else:
-            return features
+        * fields (iterable) - Variables to retrieve
+        * geojson_geometry (dict) - Geometry object in ESPG:4326
+        * year (int) - data year
+        * resolution (str) - 'tract' or 'blockgroup' (default: 'tract')
+        * ignore_missing (bool) - leave out areas with missing values
+        * crosswalk (Crosswalk) - overlay of the geometry computed by
+          crosswalk(), to use instead of fetching and overlaying areas
+        * weights (str or callable) - 'area' to weight each area's values
+          by the proportion of it within the geometry, or a function of an
+          area's values and proportion returning its weight (default: each
+          area counts in full)
+        * covering (bool) - at blockgroup resolution, take the values of
+          tracts within the geometry at tract level, and only fetch and
+          overlay the block groups of the tracts on its boundary
+        * years (iterable) - aggregate for each of these years instead of
+          for year, overlaying the geometry once for each set of boundaries
+          the years share
+        * AreaFilter options, as for geo_tract
+
+        Returns:
+
+        Dictionary containing the aggregated variable values, or, with
+        years, a dictionary of those for each year. Estimates are ints when
+        the estimates of all the areas are whole numbers and weights is not
+        set. With covering, estimates are the same as without it, but the
+        margins of error of the covered tracts are the published tract
+        margins, so the aggregate margins of error differ from those
+        computed from block groups alone.
+        '''
+        if years is not None:
+            return self._geo_years(fields, geojson_geometry, years, resolution, ignore_missing,
+                                   crosswalk, weights, covering, kwargs)
 
-    def geo(self, fields, geojson_geometry, year=None, resolution='tract', ignore_missing = False, **kwargs):
         if year is None:
             year = self.default_year
 
         fields = census.core.list_or_str(fields)
+        _aggregate_resolution(resolution, year)
+        self._check_aggregatable(fields, year, kwargs)
+
+        if crosswalk is not None:
+            _check_crosswalk(crosswalk)
+            aggregate, = self._aggregate_crosswalk(fields, crosswalk, year, ignore_missing, weights, kwargs)
+            return aggregate
 
-        as_acs = kwargs.get('as_acs', False)
-        if as_acs:
-            acs_fields = self._cross(fields)
-            for field in acs_fields:
-                if self._field_type(field, year) is not int:
-                    raise ValueError('{} is not a variable that can be aggregated your geography'.format(field))
+        if covering:
+            _check_covering(resolution)
+            features = self._covering(fields, geojson_geometry, year, **kwargs)
         else:
-            for field in fields:
-                if self._field_type(field, year) is not int:
-                    raise ValueError('{} is not a variable that can be aggregated your geography'.format(field))
+            geo_units = getattr(self, 'geo_' + resolution)
+            features = geo_units(fields, geojson_geometry, year=year, **kwargs)
 
-        resolutions = {'tract': self.geo_tract,
-                       'blockgroup': self.geo_blockgroup}
+        if kwargs.get('approximate') or kwargs.get('tolerance'):
+            features = _log_proportion_error(features)
 
-        try:
-            geo_units = resolutions[resolution]
-        except KeyError:
-            raise ValueError('{} is not a valid resolution. Choose one of {}'.format(resolution, resolution.keys()))
+        return _aggregate_units(fields, features, ignore_missing, weights)
 
-        features = geo_units(fields, geojson_geometry, year=year, **kwargs)
+    def _geo_years(self, fields, geojson_geometry, years, resolution, ignore_missing,
+                   crosswalk, weights, covering, kwargs):
+        years, layer = _years_layer(resolution, years, covering)
+        options = _area_filter_options(kwargs)
 
-        return self._aggregate(fields, features, year, ignore_missing)
+        # Years with the same boundaries share a crosswalk
+        crosswalks = {}
+        if crosswalk is not None:
+            crosswalks[crosswalk.url] = crosswalk
 
-    def _aggregate(self, fields, features, year, ignore_missing):
-        aggregated_features = collections.defaultdict(list)
-        for _, feature in features:
-            if ignore_missing and None in feature.values():
-                continue
-            for field in fields:
-                aggregated_features[field].append(feature[field])
+        aggregates = {}
+        for year in years:
+            url = _vintage(layer, year)
+            if url not in crosswalks:
+                crosswalks[url] = self.crosswalk(geojson_geometry, year, resolution, **options)
+
+            aggregates[year] = self.geo(fields, geojson_geometry, year, resolution, ignore_missing,
+                                        crosswalk=crosswalks[url], weights=weights, **kwargs)
+
+        return aggregates
+
+    def _covering(self, fields, geojson_geometry, year, **kwargs):
+        '''
+        Yield the tracts within a geometry, and the block groups of the
+        other tracts that overlap with it, each with its variable values and
+        proportion
+        '''
+        _check_two_phase(kwargs, 'covering')
+
+        options = _area_filter_options(kwargs)
+
+        tracts = self._area_filter(geojson_geometry, 'tracts', year, dict(options))
+        covered = list(tracts.contained())
+
+        yield from self._join_units(fields, covered, 'tract', _county_within, year, **kwargs)
+
+        # Block groups outside the covered tracts overlap with the rest of
+        # the geometry as much as with the whole of it
+        remainder = _remainder(tracts.geo, covered)
+        if remainder is None:
+            return
+
+        block_groups = self._area_filter(remainder, 'block groups', year, dict(options))
+
+        yield from self._join_units(fields, block_groups, 'block group', _tract_within, year, **kwargs)
+
+    def geo_many(self, fields, feature_collection, year=None, resolution='tract', ignore_missing=False,
+                 crosswalk=None, weights=None, **kwargs):
+        '''
+        Aggregate variable values within each feature of a GeoJSON
+        FeatureCollection.
+
+        Areas are fetched from tigerweb once, for the union of the features,
+        and joined to the features with an STRtree. The variable values of
+        each area are requested once, however many features it overlaps.
+
+        Arguments:
+
+        * fields (iterable) - Variables to retrieve
+        * feature_collection (dict) - FeatureCollection with geometries in
+          ESPG:4326
+        * year (int) - data year
+        * resolution (str) - 'tract' or 'blockgroup' (default: 'tract')
+        * ignore_missing (bool) - leave out areas with missing values
+        * crosswalk (Crosswalk) - overlay of the features computed by
+          crosswalk(), to use instead of fetching and overlaying areas
+        * weights (str or callable) - 'area' to weight each area's values
+          by the proportion of it within the feature, or a function of an
+          area's values and proportion returning its weight (default: each
+          area counts in full)
+        * AreaFilter options, as for geo_tract, except two_phase, which do
+          not apply to the join of areas to features
+
+        Returns:
+
+        Generator with two-tuple for each feature containing: the feature,
+        and dictionary containing the aggregated variable values
+        '''
+        if year is None:
+            year = self.default_year
+
+        fields = census.core.list_or_str(fields)
+        layer, geography, parent_within = _aggregate_resolution(resolution, year)
+        self._check_aggregatable(fields, year, kwargs)
+
+        features = feature_collection['features']
+
+        if crosswalk is not None:
+            _check_crosswalk(crosswalk, features)
+            aggregates = self._aggregate_crosswalk(fields, crosswalk, year, ignore_missing, weights, kwargs)
+            yield from zip(features, aggregates)
+            return
+
+        _, joined = self._feature_areas(feature_collection, layer, year, kwargs)
+        units = self._join_units(fields, joined, geography, parent_within, year, **kwargs)
+        aggregates = _joined_aggregates(fields, resolution, geography, len(features), units,
+                                        ignore_missing, weights)
+
+        yield from zip(features, aggregates)
+
+    def crosswalk(self, geometries, year=None, resolution='tract', **kwargs):
+        '''
+        Overlay a geometry, or each feature of a FeatureCollection, with the
+        units of a resolution, to aggregate any variables for it later
+        without fetching or overlaying areas again.
+
+        Arguments:
+
+        * geometries (dict) - Geometry object or FeatureCollection in
+          ESPG:4326
+        * year (int) - year of the boundaries
+        * resolution (str) - 'tract' or 'blockgroup' (default: 'tract')
+        * AreaFilter options, as for geo_tract
+
+        Returns:
+
+        Crosswalk, which can be saved, and passed as crosswalk to geo or
+        geo_many for any year with the same boundaries
+        '''
+        if year is None:
+            year = self.default_year
+
+        layer, _, _ = _aggregate_resolution(resolution, year)
+        feature_geos, joined = self._feature_areas(geometries, layer, year, kwargs)
+
+        return Crosswalk.from_joined(resolution, GEO_URLS[layer][year], len(feature_geos), joined)
+
+    def _aggregate_crosswalk(self, fields, crosswalk, year, ignore_missing, weights, kwargs):
+        '''
+        Aggregate variable values for each geometry of a crosswalk, and
+        return a list with a dictionary of aggregated values for each
+        '''
+        geography = _crosswalk_geography(crosswalk, year)
+        _area_filter_options(kwargs)
+        rows = self._unit_values(fields, geography, crosswalk.geoids, year, **kwargs)
+
+        return _aggregate_rows(fields, crosswalk, rows, ignore_missing, weights)
+
+    def _unit_values(self, fields, geography, geoids, year, **kwargs):
+        '''
+        Retrieve variable values for units of a geography given by their
+        GEOIDs, requesting the values for the units that share a parent
+        geography at once, and return them in the order of the GEOIDs
+        '''
+        def fetch(parent):
+            within, unit_ids = parent
+            return self._unit_index(fields, geography, unit_ids, within, year, **kwargs)
 
-        collapsed = {}
+        units = {}
+        for _, parent_units in self._map(fetch, _geoid_parents(geography, geoids)):
+            units.update(parent_units)
 
-        for field in fields:
-            if field.endswith('E'):
-                agg = sum(aggregated_features[field])
-            elif field.endswith('M'):
-                e_field = field[:-1] + 'E'
-                agg = census.math.moe_of_sum(aggregated_features[e_field],
-                                             aggregated_features[field])
-            else:
-                raise ValueError("Don't know how to aggregate this variable {}".format(feature))
+        return [units.get(geoid, {}) for geoid in geoids]
 
-            collapsed[field] = agg
+    def _aggregated_fields(self, fields, kwargs):
+        if kwargs.get('as_acs', False):
+            return self._cross(fields)
+        return fields
 
-        return collapsed
+    def _check_aggregatable(self, fields, year, kwargs):
+        fields = self._aggregated_fields(fields, kwargs)
+        _check_predicate_types(fields, [self._predicate_type(field, year) for field in fields])
 
 
 class GeoBlockClient(GeoClient):
@@ -295,15 +2299,43 @@ class GeoBlockClient(GeoClient):
         * year (int) - data year
         * return_geometry (bool) - set True to return results as GeoJSON like
           object (default: False)
+        * years (iterable) - retrieve values for each of these years instead
+          of for year, overlaying the place once for each set of boundaries
+          the years share, and return the results in a dictionary by year
+        * stream (bool) - return a generator yielding the results as they
+          are produced, instead of collecting them, for instance to write
+          them out with census_area.output (default: False)
 
         Returns:
 
         List with dictionary for each block containing variable values.
         '''
-        return self._state_place_area(self.geo_block, *args, **kwargs)
+        return self._state_place_area('block', *args, **kwargs)
+
+    def state_places_block(self, *args, **kwargs):
+        '''
+        Retrieve variable values for blocks in every incorporated place of
+        the specified state, with one query for the places and one overlay
+        for all of them.
+
+        Arguments:
+
+        * fields (iterable) - Variables to retrieve
+        * state (int or str) - state FIPS code (see
+          https://www.census.gov/library/reference/code-lists/ansi.html#state)
+        * year (int) - data year
+        * return_geometry (bool) - set True to return results as GeoJSON like
+          objects (default: False)
+
+        Returns:
+
+        Dictionary with, for each place FIPS code, a list with dictionary for
+        each block in the place containing variable values.
+        '''
+        return self._state_places_area('block', *args, **kwargs)
 
-    @supported_years(2020, 2010)
-    def geo_block(self, fields, geojson_geometry, year):
+    @supported_years(*RESOLUTION_YEARS['block'])
+    def geo_block(self, fields, geojson_geometry, year=None, **kwargs):
         '''
         Retrieve variable values for blocks intersecting with an arbitrary
         geometry.
@@ -313,6 +2345,32 @@ class GeoBlockClient(GeoClient):
         * fields (iterable) - Variables to retrieve
         * geojson_geometry (dict) - Geometry object in ESPG:4326
         * year (int) - data year
+        * batch_size (int) - overlay this many areas at a time with
+          vectorized operations (default: 1000)
+        * workers (int) - overlay batches of areas in this many processes
+        * max_tiles (int) - query tigerweb with up to this many tiles
+          covering the geometry (default: 16)
+        * spatial_filter (str) - 'polygon' to query tigerweb with simplified
+          polygons covering the geometry instead of envelopes
+        * max_query_size (int) - maximum size, in characters, of each
+          polygon sent to tigerweb (default: 4000)
+        * two_phase (bool) - fetch geometry only for areas near the
+          boundary of the geometry; areas within it are yielded without
+          geometry (default: False)
+        * approximate (bool) - have tigerweb return generalized areas, and
+          add a PROPORTION_ERROR bound to each area's properties
+        * tolerance (float) - generalization of the areas, in degrees
+          (default with approximate: 0.0001)
+        * store (BoundaryStore) - read areas from this store instead of
+          tigerweb
+        * cache (SQLiteCache) - reuse areas fetched from tigerweb by earlier
+          identical queries
+        * prefetch (int) - download up to this many areas ahead of the
+          overlay in a background thread
+        * checkpoint (Checkpoint) - record progress in this checkpoint, and
+          resume from it if the same query was interrupted
+        * stats (Stats) - record requests, areas, cache hits and the time
+          spent in each stage in this Stats
 
         Returns:
 
@@ -322,31 +2380,7 @@ class GeoBlockClient(GeoClient):
         '''
         if year is None:
             year = self.default_year
-
-        filtered_blocks = AreaFilter(geojson_geometry,
-                                     GEO_URLS['blocks'][year])
-
-        for block, intersection_proportion in filtered_blocks:
-            context = {'state': block['properties']['STATE'],
-                       'county': block['properties']['COUNTY'],
-                       'tract': block['properties']['TRACT']}
-            within = 'state:{state} county:{county} tract:{tract}'.format(**context)
-
-            tract_blocks = self.get(fields,
-                                    HashDict({'for': 'block:*',
-                                              'in':  within}),
-                                    year)
-
-            result = [result for result in tract_blocks
-                      if result['block'] == block['properties']['BLOCK']]
-
-            if result:
-                result, = result
-            else:
-                breakpoint()
-                result = {}
-
-            yield block, result, intersection_proportion
+        return self._geo_units(fields, geojson_geometry, 'block', year, kwargs)
 
 
 class ACS5Client(census.core.ACS5Client, GeoClient):
@@ -354,46 +2388,84 @@ class ACS5Client(census.core.ACS5Client, GeoClient):
     Client to access American Community Survey 5-Year Estimates (see:
     https://www.census.gov/data/developers/data-sets/acs-5year.html)
     '''
-    @supported_years(2024, 2023, 2022, 2021, 2020, 2019, 2018, 2017, 2016, 2015, 2014, 2013, 2012, 2011, 2010)
+    place_years = (2024, 2023, 2022, 2021, 2020, 2019, 2018, 2017, 2016, 2015, 2014, 2013, 2012, 2011, 2010)
+
+    @supported_years(*place_years)
     def state_place_tract(self, *args, **kwargs):
         return super().state_place_tract(*args, **kwargs)
 
-    @supported_years(2024, 2023, 2022, 2021, 2020, 2019, 2018, 2017, 2016, 2015, 2014, 2013, 2012, 2011, 2010)
+    @supported_years(*place_years)
     def state_place_blockgroup(self, *args, **kwargs):
         return super().state_place_blockgroup(*args, **kwargs)
 
+    @supported_years(*place_years)
+    def state_places_tract(self, *args, **kwargs):
+        return super().state_places_tract(*args, **kwargs)
+
+    @supported_years(*place_years)
+    def state_places_blockgroup(self, *args, **kwargs):
+        return super().state_places_blockgroup(*args, **kwargs)
+
 
 class SF1Client(census.core.SF1Client, GeoBlockClient):
     '''
     Client to access Census Summary File data (see
     https://www.census.gov/data/datasets/2010/dec/summary-file-1.html)
     '''
-    @supported_years(2010)
+    place_years = (2010,)
+
+    @supported_years(*place_years)
     def state_place_tract(self, *args, **kwargs):
         return super().state_place_tract(*args, **kwargs)
 
-    @supported_years(2010)
+    @supported_years(*place_years)
     def state_place_blockgroup(self, *args, **kwargs):
         return super().state_place_blockgroup(*args, **kwargs)
 
-    @supported_years(2010)
+    @supported_years(*place_years)
     def state_place_block(self, *args, **kwargs):
         return super().state_place_block(*args, **kwargs)
 
+    @supported_years(*place_years)
+    def state_places_tract(self, *args, **kwargs):
+        return super().state_places_tract(*args, **kwargs)
+
+    @supported_years(*place_years)
+    def state_places_blockgroup(self, *args, **kwargs):
+        return super().state_places_blockgroup(*args, **kwargs)
+
+    @supported_years(*place_years)
+    def state_places_block(self, *args, **kwargs):
+        return super().state_places_block(*args, **kwargs)
+
 
 class PLClient(census.core.PLClient, GeoBlockClient):
     '''
     Client to access Redistricting data (see
     https://www.census.gov/programs-surveys/decennial-census/about/rdo/summary-files.2020.html)
     '''
-    @supported_years(2020, 2010)
+    place_years = (2020, 2010)
+
+    @supported_years(*place_years)
     def state_place_tract(self, *args, **kwargs):
         return super().state_place_tract(*args, **kwargs)
 
-    @supported_years(2020, 2010)
+    @supported_years(*place_years)
     def state_place_blockgroup(self, *args, **kwargs):
         return super().state_place_blockgroup(*args, **kwargs)
 
-    @supported_years(2020, 2010)
+    @supported_years(*place_years)
     def state_place_block(self, *args, **kwargs):
         return super().state_place_block(*args, **kwargs)
+
+    @supported_years(*place_years)
+    def state_places_tract(self, *args, **kwargs):
+        return super().state_places_tract(*args, **kwargs)
+
+    @supported_years(*place_years)
+    def state_places_blockgroup(self, *args, **kwargs):
+        return super().state_places_blockgroup(*args, **kwargs)
+
+    @supported_years(*place_years)
+    def state_places_block(self, *args, **kwargs):
+        return super().state_places_block(*args, **kwargs)
@@ -0,0 +1,96 @@
+import numpy
+
+
+class Crosswalk(object):
+    '''
+    Proportions of the census units of a tigerweb layer that overlap with
+    each of a set of geometries, kept as a sparse matrix of geometries by
+    units in coordinate format.
+
+    The overlay does not depend on the variables or on the year of the
+    data, only on the boundaries, so a crosswalk built once can be passed
+    as crosswalk to GeoClient.geo and GeoClient.geo_many for any variables
+    and any year whose boundaries come from the same layer. Those calls
+    then only fetch variable values and multiply them by the matrix.
+
+    Build a crosswalk with GeoClient.crosswalk.
+    '''
+    def __init__(self, resolution, url, n_features, geoids, features, units, proportions):
+        self.resolution = resolution
+        self.url = url
+        self.n_features = n_features
+        self.geoids = numpy.asarray(geoids, dtype=str)
+        self.features = numpy.asarray(features, dtype=numpy.int64)
+        self.units = numpy.asarray(units, dtype=numpy.int64)
+        self.proportions = numpy.asarray(proportions, dtype=numpy.float64)
+
+    @classmethod
+    def from_joined(cls, resolution, url, n_features, joined):
+        '''
+        Build a crosswalk from areas joined to geometries, each given with
+        the indices of the geometries it overlaps and the proportion of it
+        that overlaps each
+        '''
+        geoids, features, units, proportions = [], [], [], []
+        for area, (indices, intersection_proportions) in joined:
+            features.append(indices)
+            units.append(numpy.full(len(indices), len(geoids)))
+            proportions.append(intersection_proportions)
+            geoids.append(area['properties']['GEOID'])
+
+        if not geoids:
+            return cls(resolution, url, n_features, [], [], [], [])
+
+        return cls(resolution, url, n_features, geoids,
+                   numpy.concatenate(features),
+                   numpy.concatenate(units),
+                   numpy.concatenate(proportions))
+
+    def save(self, path):
+        '''
+        Save the crosswalk to a .npz file
+        '''
+        numpy.savez_compressed(path,
+                               resolution=self.resolution,
+                               url=self.url,
+                               n_features=self.n_features,
+                               geoids=self.geoids,
+                               features=self.features,
+                               units=self.units,
+                               proportions=self.proportions)
+
+    @classmethod
+    def load(cls, path):
+        with numpy.load(path, allow_pickle=False) as saved:
+            return cls(str(saved['resolution']),
+                       str(saved['url']),
+                       int(saved['n_features']),
+                       saved['geoids'],
+                       saved['features'],
+                       saved['units'],
+                       saved['proportions'])
+
+    def dot(self, values, weights=None):
+        '''
+        Sum the rows of a units by fields array for each geometry, each
+        multiplied by the weight of its entry in the matrix if weights is
+        given, and return a geometries by fields array
+        '''
+        totals = numpy.zeros((self.n_features, values.shape[1]))
+        numpy.add.at(totals, self.features, self._weighted(values, weights))
+        return totals
+
+    def max(self, values, weights=None):
+        '''
+        Like dot, but take the largest of the rows for each geometry instead
+        of their sum. Values should not be negative.
+        '''
+        maxima = numpy.zeros((self.n_features, values.shape[1]))
+        numpy.maximum.at(maxima, self.features, self._weighted(values, weights))
+        return maxima
+
+    def _weighted(self, values, weights):
+        weighted = values[self.units]
+        if weights is not None:
+            weighted = weighted * weights[:, numpy.newaxis]
+        return weighted
@@ -0,0 +1,57 @@
+import json
+
+
+def write_ndjson(features, fp):
+    '''
+    Write features, or any JSON serializable records, to a text file object
+    as newline-delimited JSON, one line at a time as they are produced.
+
+    Arguments:
+
+    * features (iterable) - records to write, such as the generator
+      returned by a state_place_* method with stream set
+    * fp - file object to write to, such as an open file or
+      socket.makefile('w')
+
+    Returns:
+
+    Number of records written
+    '''
+    count = 0
+    for feature in features:
+        json.dump(feature, fp, separators=(',', ':'))
+        fp.write('\n')
+        count += 1
+
+    return count
+
+
+def write_feature_collection(features, fp):
+    '''
+    Write GeoJSON features to a text file object as a FeatureCollection,
+    one feature at a time as they are produced, so the whole collection is
+    never held in memory.
+
+    Arguments:
+
+    * features (iterable) - GeoJSON features, such as the generator
+      returned by a state_place_* method with stream and return_geometry
+      set
+    * fp - file object to write to
+
+    Returns:
+
+    Number of features written
+    '''
+    fp.write('{"type":"FeatureCollection","features":[\n')
+
+    count = 0
+    for feature in features:
+        if count:
+            fp.write(',\n')
+        json.dump(feature, fp, separators=(',', ':'))
+        count += 1
+
+    fp.write('\n]}\n')
+
+    return count
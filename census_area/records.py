@@ -0,0 +1,162 @@
+import array
+import math
+
+import shapely
+import shapely.geometry
+
+# Digits of the GEOID of a unit of each Census API geography
+GEOID_DIGITS = {'tract': 11,
+                'block group': 12,
+                'block': 15}
+
+# Census API geography columns of each geography, with the slice of the
+# GEOID each holds
+GEOGRAPHY_COLUMNS = {'tract': (('state', 0, 2), ('county', 2, 5), ('tract', 5, 11)),
+                     'block group': (('state', 0, 2), ('county', 2, 5), ('tract', 5, 11),
+                                     ('block group', 11, 12)),
+                     'block': (('state', 0, 2), ('county', 2, 5), ('tract', 5, 11),
+                               ('block', 11, 15))}
+
+
+class UnitRecord(object):
+    '''
+    Compact record of a unit yielded by a geo_* method. See RecordList.
+    '''
+    __slots__ = ('geoid', 'properties', 'wkb', 'values', 'ints', 'columns',
+                 'others', 'proportion')
+
+
+class RecordList(object):
+    '''
+    List of units yielded by a geo_* method, kept as compact UnitRecords
+    instead of GeoJSON dicts, for when many units are held in memory.
+
+    Each record keeps its GEOID as an int, its tigerweb properties as a
+    tuple, its geometry as WKB if geometry is set, and the numeric values
+    of fields in a typed array. Records of a list share their property and
+    field names. Units are only turned back into dicts, and geometries into
+    GeoJSON, when they are read.
+    '''
+    def __init__(self, fields, geography, geometry=False):
+        self.fields = tuple(fields)
+        self.geography = geography
+        self.geometry = geometry
+
+        self._field_indices = {field: i for i, field in enumerate(self.fields)}
+        self._columns = GEOGRAPHY_COLUMNS[geography]
+        self._digits = GEOID_DIGITS[geography]
+        self._property_names = {}
+        self._records = []
+
+    def append(self, area, result=None, proportion=None):
+        '''
+        Add a unit, given as a GeoJSON like feature, with its variable values
+        and proportion, and return its record
+        '''
+        record = UnitRecord()
+        properties = area['properties']
+        geoid = properties['GEOID']
+        record.geoid = int(geoid)
+        record.proportion = proportion
+
+        names = tuple(properties)
+        names = self._property_names.setdefault(names, names)
+        record.properties = (names, tuple(properties.values()))
+
+        if self.geometry and area['geometry'] is not None:
+            record.wkb = shapely.to_wkb(shapely.geometry.shape(area['geometry']))
+        else:
+            record.wkb = None
+
+        self._pack(record, geoid, result)
+
+        self._records.append(record)
+        return record
+
+    def _pack(self, record, geoid, result):
+        if not result:
+            record.values = None
+            record.ints = 0
+            record.columns = 0
+            record.others = ()
+            return
+
+        values = array.array('d', [math.nan]) * len(self.fields)
+        ints = 0
+        columns = 0
+        others = []
+        column_bits = {column: (1 << j, geoid[start:end])
+                       for j, (column, start, end) in enumerate(self._columns)}
+
+        for key, value in result.items():
+            i = self._field_indices.get(key)
+            if i is not None and type(value) in (int, float) and not math.isnan(value):
+                values[i] = value
+                if type(value) is int:
+                    ints |= 1 << i
+            elif key in column_bits and value == column_bits[key][1]:
+                # Geography columns are rebuilt from the GEOID
+                columns |= column_bits[key][0]
+            else:
+                others.append((key, value))
+
+        record.values = values
+        record.ints = ints
+        record.columns = columns
+        record.others = tuple(others)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __getitem__(self, index):
+        return self._records[index]
+
+    def geoid(self, record):
+        return str(record.geoid).zfill(self._digits)
+
+    def area(self, record):
+        '''
+        Return the unit of a record as a GeoJSON like feature, with no
+        geometry unless the list keeps geometry
+        '''
+        names, values = record.properties
+        if record.wkb is not None:
+            geometry = shapely.geometry.mapping(shapely.from_wkb(record.wkb))
+        else:
+            geometry = None
+
+        return {'type': 'Feature',
+                'properties': dict(zip(names, values)),
+                'geometry': geometry}
+
+    def result(self, record):
+        '''
+        Return the variable values of a record as a dictionary
+        '''
+        if record.values is None:
+            return {}
+
+        result = {}
+        geoid = self.geoid(record)
+        for j, (column, start, end) in enumerate(self._columns):
+            if record.columns & (1 << j):
+                result[column] = geoid[start:end]
+
+        for i, (field, value) in enumerate(zip(self.fields, record.values)):
+            if not math.isnan(value):
+                result[field] = int(value) if record.ints & (1 << i) else value
+
+        result.update(record.others)
+        return result
+
+    def feature(self, record):
+        '''
+        Return the unit of a record as a GeoJSON like feature, with its
+        variable values added to its properties
+        '''
+        feature = self.area(record)
+        feature['properties'].update(self.result(record))
+        return feature
@@ -0,0 +1,85 @@
+import collections
+import threading
+import urllib.parse
+
+
+class Stats(object):
+    '''
+    Counts and timings of the work done by a geo_*, geo or state_place_*
+    call, to find out where a slow call spends its time. Pass a Stats to
+    the call as stats, and read it while or after the call runs.
+
+    Attributes:
+
+    * requests (dict) - number of HTTP requests to each endpoint
+    * bytes (dict) - bytes received from each endpoint
+    * areas (dict) - number of areas 'downloaded' from tigerweb or a
+      store, including areas returned by more than one tile, 'overlaid'
+      with the geometry, 'kept', and dropped as 'below_cutoff' because at
+      most 1% of them overlaps
+    * cache (dict) - number of Census API responses found in the
+      response cache ('hits') and requested ('misses')
+    * seconds (dict) - wall time spent in each stage: 'tigerweb'
+      downloads, 'overlay', and 'census' requests. Stages that run in
+      background threads overlap with the others.
+
+    With callback set, callback(metric, value, tags) is also called with
+    each measurement as it is recorded, for instance to export it to a
+    metrics system. metric is one of the attribute names, and tags is a
+    dictionary with the endpoint, kind of area, result or stage.
+    '''
+    def __init__(self, callback=None):
+        self.callback = callback
+
+        self.requests = collections.Counter()
+        self.bytes = collections.Counter()
+        self.areas = collections.Counter()
+        self.cache = collections.Counter()
+        self.seconds = collections.Counter()
+
+        self._lock = threading.Lock()
+
+    def add_request(self, url, size):
+        endpoint = _endpoint(url)
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.bytes[endpoint] += size
+
+        self._emit('requests', 1, endpoint=endpoint)
+        self._emit('bytes', size, endpoint=endpoint)
+
+    def add_areas(self, kind, count=1):
+        with self._lock:
+            self.areas[kind] += count
+        self._emit('areas', count, kind=kind)
+
+    def add_cache(self, hit):
+        result = 'hits' if hit else 'misses'
+        with self._lock:
+            self.cache[result] += 1
+        self._emit('cache', 1, result=result)
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+        self._emit('seconds', seconds, stage=stage)
+
+    def _emit(self, metric, value, **tags):
+        if self.callback is not None:
+            self.callback(metric, value, tags)
+
+    def as_dict(self):
+        with self._lock:
+            return {'requests': dict(self.requests),
+                    'bytes': dict(self.bytes),
+                    'areas': dict(self.areas),
+                    'cache': dict(self.cache),
+                    'seconds': dict(self.seconds)}
+
+    def __repr__(self):
+        return 'Stats({})'.format(self.as_dict())
+
+
+def _endpoint(url):
+    parts = urllib.parse.urlsplit(url)
+    return '{}://{}{}'.format(parts.scheme, parts.netloc, parts.path)
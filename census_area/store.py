@@ -0,0 +1,220 @@
+import mmap
+import os
+import re
+import sqlite3
+import threading
+
+import numpy
+import shapefile
+import shapely
+import shapely.geometry
+
+from .core import ORDER_FIELDS
+from .variables import GEO_URLS
+
+# TIGER/Line shapefile fields, without their vintage suffix, and the
+# tigerweb fields they correspond to
+TIGER_FIELDS = {'STATEFP': 'STATE',
+                'COUNTYFP': 'COUNTY',
+                'TRACTCE': 'TRACT',
+                'BLKGRPCE': 'BLKGRP',
+                'BLOCKCE': 'BLOCK',
+                'PLACEFP': 'PLACE',
+                'GEOID': 'GEOID',
+                'NAME': 'BASENAME',
+                'NAMELSAD': 'NAME'}
+
+# Fields by which stored areas are looked up with where, as when finding a
+# state's places
+INDEXED_FIELDS = ('STATE', 'PLACE')
+
+
+class BoundaryStore(object):
+    '''
+    On-disk store of Census boundaries built from TIGER/Line shapefiles, to
+    use instead of tigerweb.
+
+    Boundaries are stored for each tigerweb layer in GEO_URLS, so years
+    that share a layer share boundaries. Each layer's geometries are kept
+    as WKB in a memory-mapped file, with their bounding boxes indexed in
+    an STRtree when the layer is first queried, and their properties are
+    kept in a SQLite table indexed by INDEXED_FIELDS.
+
+    Pass the store to the geo_* and state_place_* methods as store.
+    '''
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._layers = {}
+
+    def build(self, layer, year, shapefile_paths):
+        '''
+        Store the boundaries in TIGER/Line shapefiles, replacing any stored
+        for the same tigerweb layer.
+
+        Arguments:
+
+        * layer (str) - one of the keys of GEO_URLS, e.g. 'tracts'
+        * year (int) - year of the boundaries
+        * shapefile_paths (iterable) - paths of TIGER/Line shapefiles, or
+          of the zip files they are published in
+        '''
+        url = GEO_URLS[layer][year]
+
+        records = []
+        for shapefile_path in shapefile_paths:
+            with shapefile.Reader(shapefile_path) as reader:
+                for shape_record in reader.iterShapeRecords():
+                    properties = {_tigerweb_field(field): value
+                                  for field, value
+                                  in shape_record.record.as_dict().items()}
+                    geometry = shapely.geometry.shape(shape_record.shape.__geo_interface__)
+                    records.append((properties, geometry))
+
+        records.sort(key=lambda record: tuple(record[0].get(field) or ''
+                                              for field in ORDER_FIELDS[:-1]))
+
+        properties = []
+        for oid, (record_properties, _) in enumerate(records, start=1):
+            record_properties['OID'] = oid
+            properties.append(record_properties)
+
+        geometries = numpy.array([geometry for _, geometry in records])
+        wkbs = shapely.to_wkb(geometries)
+        offsets = numpy.zeros(len(wkbs) + 1, dtype=numpy.int64)
+        offsets[1:] = numpy.cumsum([len(wkb) for wkb in wkbs])
+
+        name = self._name(url)
+        with open(name + '.wkb', 'wb') as wkb_file:
+            for wkb in wkbs:
+                wkb_file.write(wkb)
+        numpy.save(name + '.offsets.npy', offsets)
+        numpy.save(name + '.bounds.npy', shapely.bounds(geometries))
+        _write_properties(name + '.sqlite', properties)
+
+        self._layers.pop(url, None)
+
+    def __contains__(self, url):
+        return os.path.exists(self._name(url) + '.sqlite')
+
+    def areas(self, url, geometry):
+        '''
+        Yield the areas of a tigerweb layer whose bounding boxes intersect
+        with a shapely geometry, as GeoJSON like features in the order of
+        ORDER_FIELDS
+        '''
+        layer = self._layer(url)
+        indices = numpy.sort(layer.tree.query(geometry))
+        for index in indices:
+            yield layer.feature(index)
+
+    def where(self, url, **criteria):
+        '''
+        Yield the areas of a tigerweb layer whose properties have the given
+        values
+        '''
+        layer = self._layer(url)
+        for index in layer.where({field: str(value) for field, value in criteria.items()}):
+            yield layer.feature(index)
+
+    def _layer(self, url):
+        if url not in self._layers:
+            if url not in self:
+                raise KeyError('No boundaries stored for {}'.format(url))
+            self._layers[url] = _StoredLayer(self._name(url))
+        return self._layers[url]
+
+    def _name(self, url):
+        service = url.split('/rest/services/')[-1]
+        return os.path.join(self.path, re.sub(r'\W+', '_', service))
+
+
+class _StoredLayer(object):
+    def __init__(self, name):
+        self.path = name + '.sqlite'
+        self._local = threading.local()
+        self.fields = [field for _, field, *_
+                       in self._connection().execute('PRAGMA table_info(properties)')]
+
+        self.offsets = numpy.load(name + '.offsets.npy', mmap_mode='r')
+        bounds = numpy.load(name + '.bounds.npy')
+        self.tree = shapely.STRtree(shapely.box(*bounds.T))
+
+        with open(name + '.wkb', 'rb') as wkb_file:
+            if self.offsets[-1]:
+                self.wkb = mmap.mmap(wkb_file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.wkb = b''
+
+    def _connection(self):
+        # SQLite connections cannot be shared across threads, and areas are
+        # read from background threads when prefetching, so each thread
+        # opens its own
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            self._local.connection = connection
+        return connection
+
+    def feature(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        geometry = shapely.from_wkb(self.wkb[start:end])
+
+        # Areas are stored in OID order, from 1. Indices from the STRtree
+        # are NumPy integers, which SQLite would take for blobs
+        row = self._connection().execute('SELECT * FROM properties WHERE "OID" = ?',
+                                         (int(index) + 1,)).fetchone()
+        return {'type': 'Feature',
+                'properties': dict(zip(self.fields, row)),
+                'geometry': shapely.geometry.mapping(geometry)}
+
+    def where(self, criteria):
+        '''
+        Return the indices of the areas whose properties have the given
+        values, in order
+        '''
+        if not set(criteria) <= set(self.fields):
+            return []
+
+        clause = ' AND '.join('{} = ?'.format(_column(field)) for field in criteria) or '1'
+        rows = self._connection().execute('SELECT "OID" FROM properties WHERE {} ORDER BY "OID"'.format(clause),
+                                          list(criteria.values()))
+        return [oid - 1 for oid, in rows]
+
+
+def _write_properties(path, properties):
+    '''
+    Store the properties of a layer's areas, which each have an OID, in a
+    SQLite table with a column for each field
+    '''
+    fields = [field for field in dict.fromkeys(field for area_properties in properties
+                                               for field in area_properties)
+              if field != 'OID']
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            # Columns without a type keep the values as pyshp read them
+            columns = ['"OID" INTEGER PRIMARY KEY'] + [_column(field) for field in fields]
+            connection.execute('CREATE TABLE properties ({})'.format(', '.join(columns)))
+            connection.executemany('INSERT INTO properties VALUES ({})'.format(', '.join('?' * len(columns))),
+                                   ([area_properties['OID']] + [area_properties.get(field) for field in fields]
+                                    for area_properties in properties))
+
+            indexed = [_column(field) for field in INDEXED_FIELDS if field in fields]
+            if indexed:
+                connection.execute('CREATE INDEX properties_indexed ON properties ({})'.format(', '.join(indexed)))
+    finally:
+        connection.close()
+
+
+def _column(field):
+    return '"{}"'.format(field.replace('"', '""'))
+
+
+def _tigerweb_field(field):
+    base = re.sub(r'(00|10|20)$', '', field)
+    return TIGER_FIELDS.get(base, field)
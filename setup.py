@@ -19,9 +19,11 @@ setup(
     packages=['census_area'],
     install_requires=['esridump',
                       'census',
-                      'shapely',
+                      'shapely>=2',
+                      'numpy',
                       'pyshp',
                       'pyproj'],
+    extras_require={'async': ['aiohttp']},
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
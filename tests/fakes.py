@@ -0,0 +1,230 @@
+import json
+import re
+import urllib.parse
+
+import shapely
+import shapely.geometry
+
+from census_area.aio import Response
+
+
+def grid(columns, rows, x=0, y=0):
+    '''
+    Build a layer of unit squares, in ORDER_FIELDS order
+    '''
+    areas = []
+    for i in range(columns):
+        for j in range(rows):
+            tract = '{:03d}{:03d}'.format(i, j)
+            areas.append({'type': 'Feature',
+                          'properties': {'STATE': '17',
+                                         'COUNTY': '031',
+                                         'TRACT': tract,
+                                         'OID': len(areas),
+                                         'GEOID': '17031' + tract},
+                          'geometry': shapely.geometry.mapping(shapely.geometry.box(x + i, y + j,
+                                                                                    x + i + 1, y + j + 1))})
+    return areas
+
+
+def county(fips, columns, rows, x=0):
+    '''
+    Build a grid of tracts in another county of Illinois
+    '''
+    tracts = grid(columns, rows, x=x)
+    for tract in tracts:
+        tract['properties']['COUNTY'] = fips
+        tract['properties']['GEOID'] = '17' + fips + tract['properties']['TRACT']
+    return tracts
+
+
+def place(fips, geo, oid=0):
+    return {'type': 'Feature',
+            'properties': {'STATE': '17',
+                           'PLACE': fips,
+                           'NAME': 'Place ' + fips,
+                           'OID': oid},
+            'geometry': shapely.geometry.mapping(geo)}
+
+
+def matches(properties, where):
+    '''
+    Evaluate a tigerweb where clause, of comparisons joined by AND and OR,
+    for an area's properties
+    '''
+    if not where:
+        return True
+
+    def comparison(match):
+        field, operator, value = match.groups()
+        if operator == '=':
+            operator = '=='
+        return 'p.get({!r}) {} {}'.format(field, operator, value)
+
+    expression = re.sub(r"(\w+)\s*(>=|<=|=|>|<)\s*('[^']*'|\d+)", comparison, where.replace('1=1', 'True'))
+    expression = expression.replace(' AND ', ' and ').replace(' OR ', ' or ')
+    return eval(expression, {'p': properties})
+
+
+class FakeDumper(object):
+    '''
+    Stand-in for esridump.EsriDumper that answers envelope, polygon and
+    where clause queries of a layer, or of the layer in layers for its URL
+    '''
+    layer = []
+    layers = {}
+
+    def __init__(self, url, extra_query_args=None, request_geometry=True, **kwargs):
+        self.layer = self.layers.get(url, self.layer)
+        self.query_args = extra_query_args or {}
+        self.request_geometry = request_geometry
+
+    def __iter__(self):
+        geometry_type = self.query_args.get('geometryType')
+        if geometry_type == 'esriGeometryEnvelope':
+            query_geo = shapely.geometry.box(*(float(x) for x in self.query_args['geometry'].split(',')))
+        elif geometry_type == 'esriGeometryPolygon':
+            rings = json.loads(self.query_args['geometry'])['rings']
+            query_geo = shapely.union_all([shapely.geometry.Polygon(ring).buffer(0) for ring in rings])
+        else:
+            query_geo = None
+
+        for area in self.layer:
+            if not matches(area['properties'], self.query_args.get('where')):
+                continue
+
+            area_geo = shapely.geometry.shape(area['geometry'])
+            if query_geo is None:
+                found = True
+            elif self.query_args['spatialRel'] == 'esriSpatialRelContains':
+                found = query_geo.contains(area_geo)
+            else:
+                found = query_geo.intersects(area_geo)
+
+            if found:
+                yield {'type': 'Feature',
+                       'properties': dict(area['properties']),
+                       'geometry': area['geometry'] if self.request_geometry else None}
+
+
+class FakeServer(object):
+    '''
+    Stand-in for tigerweb, serving the layers in a dictionary by URL as Esri
+    JSON, and the Census API, serving estimates of 100 and margins of error
+    of 10 for the tracts of the layers, or the values in estimates and moes
+    by GEOID
+
+    With paginated False, the layers do not support pagination, so
+    esridump pages through them by object id.
+    '''
+    def __init__(self, layers, page_size=10, paginated=True, estimates=None, moes=None):
+        self.layers = layers
+        self.page_size = page_size
+        self.paginated = paginated
+        self.estimates = estimates or {}
+        self.moes = moes or {}
+        self.requests = []
+
+    def respond(self, method, url, params=None, data=None):
+        args = dict(params or data or {})
+        self.requests.append((url, args))
+
+        if url.startswith('https://api.census.gov'):
+            return self._census(url, args)
+
+        layer_url, _, endpoint = url.partition('/query')
+        features = self.layers[layer_url]
+        if url == layer_url:
+            return self._json(url, {'maxRecordCount': self.page_size,
+                                    'supportsPagination': self.paginated,
+                                    'fields': [{'name': 'OID', 'type': 'esriFieldTypeOID'}]})
+
+        dumper = FakeDumper(layer_url,
+                            extra_query_args=args,
+                            request_geometry=args.get('returnGeometry', 'true').lower() == 'true')
+        dumper.layer = features
+        found = list(dumper)
+
+        if args.get('returnCountOnly') == 'true':
+            return self._json(url, {'count': len(found)})
+        if args.get('returnIdsOnly') == 'true':
+            return self._json(url, {'objectIdFieldName': 'OID',
+                                    'objectIds': [area['properties']['OID'] for area in found]})
+
+        offset = int(args.get('resultOffset', 0))
+        count = int(args.get('resultRecordCount', len(found)))
+        return self._json(url, {'features': [_esri_feature(area) for area in found[offset:offset + count]]})
+
+    def _census(self, url, args):
+        if '/variables/' in url:
+            field = url.rsplit('/', 1)[1][:-len('.json')]
+            predicate_type = 'int' if field[-1] in 'EM' else 'string'
+            return self._json(url, {'predicateType': predicate_type})
+
+        fields = args['get'].split(',')
+        geography, _, units = args['for'].partition(':')
+        within = dict(clause.split(':') for clause in args.get('in', '').split())
+
+        headers = fields + ['state', 'county', 'tract']
+        rows = []
+        for features in self.layers.values():
+            for area in features:
+                properties = area['properties']
+                unit = (properties.get('STATE'), properties.get('COUNTY'), properties.get('TRACT'))
+                if None in unit or (units != '*' and unit[2] not in units.split(',')):
+                    continue
+                if within != {'state': unit[0], 'county': unit[1]}:
+                    continue
+
+                geoid = properties['GEOID']
+                values = [str(self.estimates.get(geoid, 100)) if field.endswith('E')
+                          else str(self.moes.get(geoid, 10))
+                          for field in fields]
+                row = values + list(unit)
+                if row not in rows:
+                    rows.append(row)
+
+        if not rows:
+            return Response(url, 204, b'')
+        return self._json(url + '?' + urllib.parse.urlencode(args), [headers] + rows)
+
+    def _json(self, url, data):
+        return Response(url, 200, json.dumps(data).encode())
+
+
+class FakeTransport(object):
+    '''
+    Transport of the asyncio clients that sends its requests to a
+    FakeServer
+    '''
+    def __init__(self, server):
+        self.server = server
+
+    async def request(self, method, url, params=None, data=None):
+        return self.server.respond(method, url, params, data)
+
+    async def close(self):
+        pass
+
+
+class FakeSession(object):
+    '''
+    Session of the GeoClient that sends its requests to a FakeServer
+    '''
+    def __init__(self, server):
+        self.server = server
+
+    def get(self, url, params=None, **kwargs):
+        return self.server.respond('GET', url, params)
+
+    def close(self):
+        pass
+
+
+def _esri_feature(area):
+    feature = {'attributes': area['properties']}
+    if area['geometry'] is not None:
+        polygon = shapely.geometry.polygon.orient(shapely.geometry.shape(area['geometry']), sign=-1.0)
+        feature['geometry'] = {'rings': [list(map(list, ring.coords))
+                                         for ring in [polygon.exterior, *polygon.interiors]]}
+    return feature
@@ -0,0 +1,80 @@
+import math
+import unittest
+import unittest.mock
+
+import shapely.geometry
+
+from census_area.core import ACS5Client
+from census_area.variables import GEO_URLS
+
+from fakes import FakeDumper, FakeServer, FakeSession, grid
+
+FIELDS = ('B01001_001E', 'B01001_001M')
+
+# The tracts of a two by two grid, by column
+TRACTS = ('17031000000', '17031000001', '17031001000', '17031001001')
+
+
+class TestAggregate(unittest.TestCase):
+
+    def setUp(self):
+        self.layers = {GEO_URLS['tracts'][2019]: grid(2, 2)}
+
+        patcher = unittest.mock.patch.object(FakeDumper, 'layers', self.layers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch('census_area.core.esridump.EsriDumper', FakeDumper)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def geo(self, estimates, moes=None, geometry=shapely.geometry.box(0, 0, 2, 2), **kwargs):
+        server = FakeServer(self.layers,
+                            estimates=dict(zip(TRACTS, estimates)),
+                            moes=dict(zip(TRACTS, moes or ())))
+        client = ACS5Client('key', 2019, session=FakeSession(server))
+        return client.geo(FIELDS, shapely.geometry.mapping(geometry), **kwargs)
+
+    def test_margin_of_error(self):
+        aggregate = self.geo([0, 0, 50, 30], [12, 20, 5, 4])
+
+        # Only the largest margin of error of the tracts with no estimate
+        # counts
+        self.assertEqual(aggregate['B01001_001E'], 80)
+        self.assertAlmostEqual(aggregate['B01001_001M'], math.sqrt(20 ** 2 + 5 ** 2 + 4 ** 2))
+
+    def test_margin_of_error_without_zeros(self):
+        aggregate = self.geo([10, 20, 50, 30], [12, 20, 5, 4])
+
+        self.assertAlmostEqual(aggregate['B01001_001M'],
+                               math.sqrt(12 ** 2 + 20 ** 2 + 5 ** 2 + 4 ** 2))
+
+    def test_area_weights(self):
+        # All of the first column of tracts, and half of the second
+        aggregate = self.geo([10, 20, 30, 40], [10, 10, 10, 10],
+                             geometry=shapely.geometry.box(0, 0, 1.5, 2), weights='area')
+
+        self.assertAlmostEqual(aggregate['B01001_001E'], 10 + 20 + 30 / 2 + 40 / 2)
+        self.assertIsInstance(aggregate['B01001_001E'], float)
+        self.assertAlmostEqual(aggregate['B01001_001M'], math.sqrt(2 * 10 ** 2 + 2 * 5 ** 2))
+
+    def test_weight_function(self):
+        aggregate = self.geo([10, 20, 30, 40], [10, 10, 10, 10],
+                             weights=lambda row, proportion: row['B01001_001E'] > 15)
+
+        self.assertEqual(aggregate['B01001_001E'], 20 + 30 + 40)
+
+    def test_ints(self):
+        aggregate = self.geo([10, 20, 30, 40])
+
+        self.assertEqual(aggregate['B01001_001E'], 100)
+        self.assertIsInstance(aggregate['B01001_001E'], int)
+        self.assertIsInstance(aggregate['B01001_001M'], float)
+
+        aggregate = self.geo([10, 20, 30, 40.5])
+
+        self.assertEqual(aggregate['B01001_001E'], 100.5)
+        self.assertIsInstance(aggregate['B01001_001E'], float)
+
+
+if __name__ == '__main__':
+    unittest.main()
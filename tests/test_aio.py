@@ -0,0 +1,100 @@
+import unittest
+import unittest.mock
+
+import census.core
+import shapely.geometry
+
+from census_area.aio import AsyncACS5Client
+from census_area.core import ACS5Client
+from census_area.variables import GEO_URLS
+
+from fakes import FakeDumper, FakeServer, FakeSession, FakeTransport, grid, place
+
+FIELDS = ('B01001_001E', 'B01001_001M')
+
+
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        tracts = grid(6, 4)
+        places = [place('14000', shapely.geometry.box(0.5, 0.5, 3.5, 2.5), 1),
+                  place('20000', shapely.geometry.box(3.2, 1.2, 5.5, 3.8), 2)]
+        self.layers = {GEO_URLS['tracts'][2019]: tracts,
+                       GEO_URLS['incorporated places'][2019]: places}
+        self.estimates = {area['properties']['GEOID']: i for i, area in enumerate(tracts)}
+
+        self.server = FakeServer(self.layers, estimates=self.estimates)
+        self.client = AsyncACS5Client('key', 2019, transport=FakeTransport(self.server))
+
+        # The GeoClient gets the same areas from esridump, and values from
+        # the Census API, as the asyncio client gets through its transport
+        patcher = unittest.mock.patch.object(FakeDumper, 'layers', self.layers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch('census_area.core.esridump.EsriDumper', FakeDumper)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sync_client = ACS5Client('key', 2019,
+                                      session=FakeSession(FakeServer(self.layers, estimates=self.estimates)))
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    def units(self, units):
+        return sorted((area['properties']['GEOID'], round(intersection_proportion, 9), result)
+                      for area, result, intersection_proportion in units)
+
+    async def test_geo_tract(self):
+        disc = shapely.geometry.mapping(shapely.geometry.Point(3, 2).buffer(1.7, 64))
+
+        units = [unit async for unit in self.client.geo_tract(FIELDS, disc)]
+
+        self.assertTrue(units)
+        self.assertEqual(self.units(units), self.units(self.sync_client.geo_tract(FIELDS, disc)))
+
+    async def test_pages(self):
+        box = shapely.geometry.mapping(shapely.geometry.box(0.5, 0.5, 5.5, 3.5))
+
+        units = [unit async for unit in self.client.geo_tract(FIELDS, box, max_tiles=1)]
+
+        self.assertEqual(len(units), 24)
+        offsets = {args['resultOffset'] for _, args in self.server.requests if 'resultOffset' in args}
+        self.assertEqual(offsets, {'0', '10', '20'})
+
+    async def test_layer_without_pagination(self):
+        self.server.paginated = False
+        box = shapely.geometry.mapping(shapely.geometry.box(0.5, 0.5, 5.5, 3.5))
+
+        units = [unit async for unit in self.client.geo_tract(FIELDS, box, max_tiles=1)]
+
+        self.assertEqual(self.units(units), self.units(self.sync_client.geo_tract(FIELDS, box, max_tiles=1)))
+        self.assertTrue(any('OID >=' in args.get('where', '') for _, args in self.server.requests))
+
+    async def test_geo(self):
+        disc = shapely.geometry.mapping(shapely.geometry.Point(3, 2).buffer(1.7, 64))
+
+        for weights in (None, 'area'):
+            with self.subTest(weights=weights):
+                self.assertEqual(await self.client.geo(FIELDS, disc, weights=weights),
+                                 self.sync_client.geo(FIELDS, disc, weights=weights))
+
+    async def test_state_places(self):
+        places = await self.client.state_places_tract(FIELDS, 17)
+
+        self.assertEqual(set(places), {'14000', '20000'})
+        self.assertEqual(places, self.sync_client.state_places_tract(FIELDS, 17))
+
+    async def test_state_place_years(self):
+        # 2000 tracts are in tigerweb, but the ACS5 starts in 2010
+        for years in ([2019, 2000], [2019, 1990]):
+            with self.subTest(years=years):
+                with self.assertRaises(census.core.UnsupportedYearException):
+                    await self.client.state_place_tract(FIELDS, 17, '14000', years=years)
+                with self.assertRaises(census.core.UnsupportedYearException):
+                    self.sync_client.state_place_tract(FIELDS, 17, '14000', years=years)
+
+        self.assertEqual(self.server.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
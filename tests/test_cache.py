@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+import zlib
+
+from census_area.cache import ResponseCache, SQLiteCache
+from census_area.core import ACS5Client
+from census_area.variables import GEO_URLS
+
+from fakes import FakeServer, FakeSession, grid
+
+COUNTY = {'for': 'tract:*', 'in': 'state:17 county:031'}
+
+
+class Clock(object):
+    '''
+    Stand-in for time.time that only moves when told to
+    '''
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSQLiteCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.sqlite')
+
+        self.clock = Clock()
+        patcher = unittest.mock.patch('census_area.cache.time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_ttl(self):
+        cache = SQLiteCache(self.path, ttl=60)
+        cache.set('key', {'a': [1, 2]})
+
+        self.clock.now += 59
+        self.assertEqual(cache.get('key'), {'a': [1, 2]})
+
+        # Reading an entry does not extend its life
+        self.clock.now += 2
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.keys(), [])
+
+    def test_no_ttl(self):
+        cache = SQLiteCache(self.path, ttl=None)
+        cache.set('key', 1)
+
+        self.clock.now += 10 ** 9
+        self.assertEqual(cache.get('key'), 1)
+
+    def test_lru_eviction(self):
+        value = ['x' * 100]
+        size = len(zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8')))
+        cache = SQLiteCache(self.path, max_size=3 * size)
+
+        for key in ('a', 'b', 'c'):
+            self.clock.now += 1
+            cache.set(key, value)
+
+        self.clock.now += 1
+        cache.get('a')
+
+        self.clock.now += 1
+        cache.set('d', value)
+
+        # b was used least recently
+        self.assertEqual(sorted(cache.keys()), ['a', 'c', 'd'])
+        self.assertIsNone(cache.get('b'))
+
+    def test_keys(self):
+        cache = SQLiteCache(self.path)
+        for key in ('acs5/2019?for=tract:*|B01001_001E', 'acs5/2019?for=tract:*|B01001_002E',
+                    'acs5/2020?for=tract:*|B01001_001E'):
+            cache.set(key, [])
+
+        self.assertEqual(sorted(cache.keys('acs5/2019?for=tract:*|')),
+                         ['acs5/2019?for=tract:*|B01001_001E', 'acs5/2019?for=tract:*|B01001_002E'])
+        self.assertEqual(len(cache.keys()), 3)
+
+    def test_shared(self):
+        SQLiteCache(self.path).set('key', 'value')
+
+        self.assertEqual(SQLiteCache(self.path).get('key'), 'value')
+
+
+class TestResponseCache(unittest.TestCase):
+
+    rows = [{'B01001_001E': 100.0, 'B01001_001M': 10.0,
+             'state': '17', 'county': '031', 'tract': tract}
+            for tract in ('000100', '000200', '000300')]
+
+    def test_fields(self):
+        cache = ResponseCache()
+        cache.set('acs5', 2019, ['B01001_001E', 'B01001_001M'], COUNTY, self.rows)
+
+        self.assertEqual(cache.get('acs5', 2019, ['B01001_001M'], COUNTY),
+                         [{'B01001_001M': 10.0, 'state': '17', 'county': '031', 'tract': tract}
+                          for tract in ('000100', '000200', '000300')])
+        self.assertEqual(cache.get('acs5', 2019, ['B01001_001E', 'B01001_001M'], COUNTY), self.rows)
+        self.assertIsNone(cache.get('acs5', 2019, ['B01001_001E', 'B01001_002E'], COUNTY))
+        self.assertIsNone(cache.get('acs5', 2020, ['B01001_001E'], COUNTY))
+
+    def test_units(self):
+        cache = ResponseCache()
+        cache.set('acs5', 2019, ['B01001_001E', 'B01001_001M'], COUNTY, self.rows)
+
+        rows = cache.get('acs5', 2019, ['B01001_001E'],
+                         {'for': 'tract:000300,000100', 'in': 'state:17 county:031'})
+        self.assertEqual([row['tract'] for row in rows], ['000100', '000300'])
+        self.assertEqual(set(rows[0]), {'B01001_001E', 'state', 'county', 'tract'})
+
+        # All the units of another county are not cached
+        self.assertIsNone(cache.get('acs5', 2019, ['B01001_001E'],
+                                    {'for': 'tract:000100', 'in': 'state:17 county:043'}))
+
+    def test_copies(self):
+        cache = ResponseCache()
+        cache.set('acs5', 2019, ['B01001_001E', 'B01001_001M'], COUNTY, self.rows)
+
+        cache.get('acs5', 2019, ['B01001_001E', 'B01001_001M'], COUNTY)[0]['B01001_001E'] = 0
+        self.assertEqual(cache.get('acs5', 2019, ['B01001_001E'], COUNTY)[0]['B01001_001E'], 100.0)
+
+    def test_memory_size(self):
+        cache = ResponseCache(memory_size=1)
+        cache.set('acs5', 2019, ['B01001_001E'], COUNTY, self.rows)
+        cache.set('acs5', 2019, ['B01001_001M'], COUNTY, self.rows)
+
+        self.assertIsNone(cache.get('acs5', 2019, ['B01001_001E'], COUNTY))
+        self.assertIsNotNone(cache.get('acs5', 2019, ['B01001_001M'], COUNTY))
+
+    def test_disk(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        disk = SQLiteCache(os.path.join(directory.name, 'cache.sqlite'))
+
+        ResponseCache(disk=disk).set('acs5', 2019, ['B01001_001E', 'B01001_001M'], COUNTY, self.rows)
+
+        # Another process's cache finds the response on disk
+        rows = ResponseCache(disk=disk).get('acs5', 2019, ['B01001_001E'],
+                                            {'for': 'tract:000200', 'in': 'state:17 county:031'})
+        self.assertEqual(rows, [{'B01001_001E': 100.0, 'state': '17', 'county': '031', 'tract': '000200'}])
+
+    def test_client(self):
+        server = FakeServer({GEO_URLS['tracts'][2019]: grid(2, 2)})
+        client = ACS5Client('key', 2019, session=FakeSession(server))
+
+        county = client.get(('B01001_001E', 'B01001_001M'), COUNTY)
+        tracts = client.get('B01001_001E', {'for': 'tract:001001,000000', 'in': 'state:17 county:031'})
+
+        self.assertEqual(len(county), 4)
+        self.assertEqual(tracts, [{'B01001_001E': 100.0, 'state': '17', 'county': '031', 'tract': tract}
+                                  for tract in ('000000', '001001')])
+        self.assertEqual(len([url for url, args in server.requests if 'get' in args]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import shapely.geometry
+
+from census_area.checkpoint import Checkpoint
+from census_area.core import ACS5Client, AreaFilter
+from census_area.variables import GEO_URLS
+
+from fakes import FakeDumper, FakeServer, FakeSession, county
+
+FIELDS = ('B01001_001E', 'B01001_001M')
+
+BOX = shapely.geometry.mapping(shapely.geometry.box(0.5, 0.5, 3.5, 1.5))
+
+
+class FailingSession(FakeSession):
+    '''
+    Session whose Census API requests for a county fail
+    '''
+    def __init__(self, server, county):
+        super().__init__(server)
+        self.county = county
+
+    def get(self, url, params=None, **kwargs):
+        if params and params.get('in', '').endswith('county:' + self.county):
+            raise RuntimeError('Connection lost')
+        return super().get(url, params, **kwargs)
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = Checkpoint(os.path.join(directory.name, 'checkpoint.sqlite'))
+
+        self.layers = {GEO_URLS['tracts'][2019]: county('031', 2, 2) + county('043', 2, 2, x=2)}
+        patcher = unittest.mock.patch.object(FakeDumper, 'layers', self.layers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch('census_area.core.esridump.EsriDumper', FakeDumper)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.server = FakeServer(self.layers)
+
+    def geoids(self, units):
+        return [area['properties']['GEOID'] for area, _, _ in units]
+
+    def census_requests(self):
+        return [args['in'] for url, args in self.server.requests if 'get' in args]
+
+    def test_after(self):
+        areas = AreaFilter(BOX, GEO_URLS['tracts'][2019], after=('17', '031'))
+
+        self.assertEqual({area['properties']['COUNTY'] for area, _ in areas}, {'043'})
+
+    def test_resume(self):
+        expected = self.geoids(ACS5Client('key', 2019, session=FakeSession(self.server)).geo_tract(FIELDS, BOX))
+        self.server.requests.clear()
+
+        failing = ACS5Client('key', 2019, session=FailingSession(self.server, '043'))
+        units = failing.geo_tract(FIELDS, BOX, checkpoint=self.checkpoint)
+        with self.assertRaises(RuntimeError):
+            for _ in units:
+                pass
+
+        # The first county was stored before the second was asked for
+        client = ACS5Client('key', 2019, session=FakeSession(self.server))
+        self.server.requests.clear()
+        with unittest.mock.patch('census_area.core.AreaFilter', wraps=AreaFilter) as area_filter:
+            units = list(client.geo_tract(FIELDS, BOX, checkpoint=self.checkpoint))
+
+        self.assertEqual(self.geoids(units), expected)
+        self.assertEqual(area_filter.call_args.kwargs['after'], ('17', '031'))
+        self.assertEqual(self.census_requests(), ['state:17 county:043'])
+        for _, result, _ in units:
+            self.assertEqual(result['B01001_001E'], 100)
+
+        # A finished query is answered from the checkpoint alone
+        self.server.requests.clear()
+        self.assertEqual(self.geoids(client.geo_tract(FIELDS, BOX, checkpoint=self.checkpoint)), expected)
+        self.assertEqual(self.server.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
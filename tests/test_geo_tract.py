@@ -0,0 +1,68 @@
+import unittest
+import unittest.mock
+
+import shapely.geometry
+
+from census_area.core import ACS5Client, MAX_LISTED_UNITS
+from census_area.variables import GEO_URLS
+
+from fakes import FakeDumper, FakeServer, FakeSession, county
+
+FIELDS = ('B01001_001E', 'B01001_001M')
+
+
+class TestGeoTract(unittest.TestCase):
+
+    def client(self, tracts):
+        layers = {GEO_URLS['tracts'][2019]: tracts}
+        estimates = {tract['properties']['GEOID']: i for i, tract in enumerate(tracts)}
+
+        patcher = unittest.mock.patch.object(FakeDumper, 'layers', layers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = unittest.mock.patch('census_area.core.esridump.EsriDumper', FakeDumper)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.server = FakeServer(layers, estimates=estimates)
+        return ACS5Client('key', 2019, session=FakeSession(self.server)), estimates
+
+    def census_requests(self):
+        return [(args['for'], args['in']) for url, args in self.server.requests
+                if url.startswith('https://api.census.gov') and 'get' in args]
+
+    def test_county_batches(self):
+        client, estimates = self.client(county('031', 3, 2) + county('043', 3, 2, x=3))
+        box = shapely.geometry.mapping(shapely.geometry.box(1.5, 0.5, 4.5, 1.5))
+
+        units = list(client.geo_tract(FIELDS, box))
+
+        # One request for the tracts of each county, listing them
+        self.assertEqual(self.census_requests(),
+                         [('tract:001000,001001,002000,002001', 'state:17 county:031'),
+                          ('tract:000000,000001,001000,001001', 'state:17 county:043')])
+
+        self.assertEqual(len(units), 8)
+        for area, result, _ in units:
+            geoid = area['properties']['GEOID']
+            self.assertEqual(result['B01001_001E'], estimates[geoid])
+            self.assertEqual(result['state'] + result['county'] + result['tract'], geoid)
+
+    def test_large_county(self):
+        client, estimates = self.client(county('031', 8, 8))
+        # The bottom seven rows of tracts
+        box = shapely.geometry.mapping(shapely.geometry.box(0.5, 0.5, 7.5, 6.5))
+
+        units = list(client.geo_tract(FIELDS, box))
+
+        # Too many tracts to list, so the whole county is asked for, and
+        # only the tracts that overlap are kept
+        self.assertGreater(len(units), MAX_LISTED_UNITS)
+        self.assertEqual(self.census_requests(), [('tract:*', 'state:17 county:031')])
+        self.assertEqual(len(units), 56)
+        for area, result, _ in units:
+            self.assertEqual(result['B01001_001E'], estimates[area['properties']['GEOID']])
+
+
+if __name__ == '__main__':
+    unittest.main()
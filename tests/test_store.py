@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+
+import shapefile
+import shapely.geometry
+
+from census_area.store import BoundaryStore
+from census_area.variables import GEO_URLS
+
+
+def write_shapefile(path, fields, records):
+    '''
+    Write a TIGER/Line like shapefile of polygons, from records of
+    properties and shapely polygons
+    '''
+    with shapefile.Writer(path, shapeType=shapefile.POLYGON) as writer:
+        for field in fields:
+            writer.field(field, 'C', size=40)
+        for properties, polygon in records:
+            # Shapefile exterior rings are clockwise
+            polygon = shapely.geometry.polygon.orient(polygon, sign=-1.0)
+            writer.poly([list(polygon.exterior.coords)])
+            writer.record(*(properties[field] for field in fields))
+
+
+class TestBoundaryStore(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+
+        # Written out of order, as the store sorts them
+        tracts = [({'STATEFP': state, 'COUNTYFP': '031', 'TRACTCE': tract,
+                    'GEOID': state + '031' + tract, 'NAME': tract, 'NAMELSAD': 'Census Tract ' + tract},
+                   shapely.geometry.box(x, 0, x + 1, 1))
+                  for x, (state, tract) in enumerate([('18', '000100'), ('17', '000200'), ('17', '000100')])]
+        places = [({'STATEFP': state, 'PLACEFP': place, 'GEOID': state + place,
+                    'NAME': name, 'NAMELSAD': name + ' city'},
+                   shapely.geometry.box(x, 0, x + 2, 1))
+                  for x, (state, place, name) in enumerate([('17', '14000', 'Chicago'),
+                                                            ('17', '20000', 'Evanston'),
+                                                            ('18', '14000', 'Gary')])]
+
+        write_shapefile(os.path.join(self.path, 'tl_2019_tract'),
+                        ['STATEFP', 'COUNTYFP', 'TRACTCE', 'GEOID', 'NAME', 'NAMELSAD'], tracts)
+        write_shapefile(os.path.join(self.path, 'tl_2019_place'),
+                        ['STATEFP', 'PLACEFP', 'GEOID', 'NAME', 'NAMELSAD'], places)
+
+        self.store = BoundaryStore(os.path.join(self.path, 'store'))
+        self.store.build('tracts', 2019, [os.path.join(self.path, 'tl_2019_tract.shp')])
+        self.store.build('incorporated places', 2019, [os.path.join(self.path, 'tl_2019_place.shp')])
+
+    def test_areas(self):
+        areas = list(self.store.areas(GEO_URLS['tracts'][2019], shapely.geometry.box(0.5, 0.2, 2.5, 0.8)))
+
+        self.assertEqual([area['properties']['GEOID'] for area in areas],
+                         ['17031000100', '17031000200', '18031000100'])
+        self.assertEqual(areas[0]['properties'],
+                         {'OID': 1, 'STATE': '17', 'COUNTY': '031', 'TRACT': '000100',
+                          'GEOID': '17031000100', 'BASENAME': '000100', 'NAME': 'Census Tract 000100'})
+        self.assertEqual(shapely.geometry.shape(areas[0]['geometry']).bounds, (2.0, 0.0, 3.0, 1.0))
+
+    def test_where(self):
+        url = GEO_URLS['incorporated places'][2019]
+
+        self.assertEqual([area['properties']['NAME'] for area in self.store.where(url, STATE=17)],
+                         ['Chicago city', 'Evanston city'])
+        self.assertEqual([area['properties']['NAME'] for area in self.store.where(url, STATE='18', PLACE='14000')],
+                         ['Gary city'])
+        self.assertEqual(list(self.store.where(url, STATE='17', COUSUB='00000')), [])
+
+    def test_build_replaces(self):
+        url = GEO_URLS['tracts'][2019]
+        self.store.areas(url, shapely.geometry.box(0, 0, 1, 1))
+        self.store.build('tracts', 2019, [os.path.join(self.path, 'tl_2019_place.shp')])
+
+        self.assertIn(url, self.store)
+        self.assertEqual([area['properties']['PLACE'] for area in self.store.where(url, STATE='17')],
+                         ['14000', '20000'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import unittest.mock
+
+import shapely
+import shapely.affinity
+import shapely.geometry
+
+from census_area.core import AreaFilter
+
+from fakes import FakeDumper, grid
+
+LAYER_URL = 'https://example.com/arcgis/rest/services/tracts/MapServer/0'
+
+
+class TestTwoPhase(unittest.TestCase):
+
+    def setUp(self):
+        FakeDumper.layer = grid(20, 12)
+        patcher = unittest.mock.patch('census_area.core.esridump.EsriDumper', FakeDumper)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def proportions(self, geo, **kwargs):
+        return {area['properties']['GEOID']: round(intersection_proportion, 9)
+                for area, intersection_proportion
+                in AreaFilter(shapely.geometry.mapping(geo), LAYER_URL, **kwargs)}
+
+    def assert_same_areas(self, geo, **kwargs):
+        expected = self.proportions(geo, **kwargs)
+        self.assertTrue(expected)
+        self.assertEqual(self.proportions(geo, two_phase=True, **kwargs), expected)
+
+    def test_axis_aligned_l(self):
+        l_shape = shapely.geometry.Polygon([(0.3, 0.3), (11.7, 0.3), (11.7, 3.7),
+                                            (3.7, 3.7), (3.7, 9.7), (0.3, 9.7)])
+        for max_tiles in (1, 16):
+            with self.subTest(max_tiles=max_tiles):
+                self.assert_same_areas(l_shape, max_tiles=max_tiles)
+
+    def test_rotated_l(self):
+        l_shape = shapely.geometry.Polygon([(0.3, 0.3), (11.7, 0.3), (11.7, 3.7),
+                                            (3.7, 3.7), (3.7, 9.7), (0.3, 9.7)])
+        self.assert_same_areas(shapely.affinity.rotate(l_shape, 30, origin=(6, 5)))
+
+    def test_diagonal_corridor(self):
+        corridor = shapely.geometry.LineString([(0.5, 0.5), (19.5, 11.5)]).buffer(1.3)
+        self.assert_same_areas(corridor)
+
+    def test_interior_areas_without_geometry(self):
+        disc = shapely.geometry.Point(10, 6).buffer(5, 64)
+        areas = list(AreaFilter(shapely.geometry.mapping(disc), LAYER_URL, two_phase=True))
+        self.assertTrue(any(area['geometry'] is None for area, _ in areas))
+
+
+if __name__ == '__main__':
+    unittest.main()